@@ -1,7 +1,11 @@
 # app.py
 
 import asyncio
+import logging
+import logging.handlers
+import queue
 from core.event_bus import EventBus
+from core import http_client
 from audio.audio_module import AudioModule
 from vision.vision_module import VisionModule
 from voice.voice_module import VoiceModule
@@ -9,6 +13,23 @@ from voice.stt_module import STTModule
 from voice.command_parser import CommandParser
 from events.events import UserCommand
 
+logger = logging.getLogger(__name__)
+
+def setup_logging(level=logging.INFO) -> logging.handlers.QueueListener:
+    """
+    Route all records through a queue: the event loop and audio threads only
+    enqueue, and one listener thread does the console writes.
+    """
+    records = queue.SimpleQueue()
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    listener = logging.handlers.QueueListener(records, console)
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(records)]
+    root.setLevel(level)
+    listener.start()
+    return listener
+
 async def main():
     bus     = EventBus()
     audio   = AudioModule()
@@ -19,7 +40,7 @@ async def main():
 
     # subscribe to user commands
     def handle_user_command(ev: UserCommand):
-        print(f"[APP] Got UserCommand: {ev.command}, params={ev.params}")
+        logger.info("Got UserCommand: %s, params=%s", ev.command, ev.params)
         # e.g. if ev.command == "describe": kick off captioning or LLM
     bus.subscribe(UserCommand, handle_user_command)
 
@@ -29,7 +50,19 @@ async def main():
     voice.start()
 
     # run forever
-    await asyncio.Event().wait()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await http_client.aclose()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        import uvloop  # faster socket I/O for the cloud calls, when installed
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+    listener = setup_logging()
+    try:
+        asyncio.run(main())
+    finally:
+        listener.stop()
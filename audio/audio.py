@@ -6,9 +6,17 @@ import subprocess
 import threading
 import signal
 import heapq
+import selectors
 import uuid
-import time
 import os
+import shutil
+
+from audio.energy import EnergyGate
+from audio.pa_read import PaReader
+from audio.ring import FrameRing
+
+# resolved once; with an absolute path and close_fds=False, Popen uses posix_spawn
+_PAPLAY = shutil.which('paplay') or '/usr/bin/paplay'
 
 # ── AudioModule: continuous VAD capture & priority playback ───────────────
 class AudioModule:
@@ -19,6 +27,7 @@ class AudioModule:
         sample_rate=16000,
         frame_ms=30,
         vad_aggressiveness=1,
+        max_utterance_ms=30000,
     ):
         # Recording/VAD config
         self.FORMAT = format
@@ -27,22 +36,34 @@ class AudioModule:
         self.SAMPLE_WIDTH = pasimple.format2width(format)
         self.FRAME_MS = frame_ms
         self.FRAME_BYTES = int(sample_rate * frame_ms / 1000) * self.SAMPLE_WIDTH * channels
+        # record() stops at this length even if the speaker hasn't paused
+        self.MAX_UTTERANCE_BYTES = max_utterance_ms // frame_ms * self.FRAME_BYTES
 
         # VAD
         self.vad = webrtcvad.Vad(vad_aggressiveness)
+        self._energy_gate = EnergyGate()
         self._vad_running = False
         self._vad_thread = None
-        self.loop = asyncio.get_event_loop()
-        self.frame_queue = asyncio.Queue()
+        self.loop = None  # bound to the running loop by record()
+        # VAD thread copies frames + VAD flags into preallocated slots;
+        # record() awaits one wakeup per batch and drains them in place.
+        # 64 slots ≈ 1.9 s; when record() falls behind, new frames are dropped
+        # (counted in self._frames.dropped) rather than queued without bound.
+        self._frames = FrameRing(64, self.FRAME_BYTES)
 
         # Playback scheduler
         self._sched_cond = threading.Condition()
         self._schedule_queue = []  # heap of (-priority, count, ScheduledSound)
+        self._stopped_pids = set() # stopped while still queued; dropped when they reach the top
         self._counter = 0
         self._current_task = None
         self._paused_tasks = set()
         self._scheduler_thread = threading.Thread(target=self._scheduler_loop, daemon=True)
-        self._scheduler_running = False
+        self._sched_stop = threading.Event()
+        # Self-pipe used to wake the scheduler when a sound must be preempted
+        self._preempt_r, self._preempt_w = os.pipe()
+        os.set_blocking(self._preempt_r, False)
+        os.set_blocking(self._preempt_w, False)
 
     # ── Async capture: non-blocking listen & save ───────────────────────────
     async def record(self, silence_duration: float = 1.0, tmp_dir: str = '/tmp') -> str:
@@ -50,25 +71,45 @@ class AudioModule:
         Asynchronously listen via VAD, start on speech, stop after silence_duration,
         save WAV to tmp_dir, return file path.
         """
+        self.loop = asyncio.get_running_loop()
         self.start_vad_stream()
 
-        buffer = bytearray()
+        # preallocated to the utterance cap and filled in place by offset
+        buffer = bytearray(self.MAX_UTTERANCE_BYTES)
+        view = memoryview(buffer)
+        used = 0
+        fb = self.FRAME_BYTES
         in_speech = False
         silence_count = 0
         threshold = int((silence_duration * 1000) / self.FRAME_MS)
 
-        while True:
-            frame, is_speech = await self.frame_queue.get()
-            if is_speech:
-                in_speech = True
-                buffer.extend(frame)
-                silence_count = 0
-            else:
-                if in_speech:
-                    buffer.extend(frame)
+        ring = self._frames
+        last_seq = None
+        done = False
+        while not done:
+            await ring.wait(self.loop)
+            while not done:
+                item = ring.peek()
+                if item is None:
+                    break
+                frame, is_speech, seq = item
+                if last_seq is not None and seq != last_seq + 1:
+                    # frames were dropped; restart rather than splice across the gap
+                    used = 0
+                    in_speech = False
+                    silence_count = 0
+                last_seq = seq
+                if is_speech:
+                    in_speech = True
+                    silence_count = 0
+                elif in_speech:
                     silence_count += 1
-                    if silence_count >= threshold:
-                        break
+                    done = silence_count >= threshold
+                if in_speech:
+                    view[used:used + fb] = frame
+                    used += fb
+                    done = done or used + fb > len(buffer)
+                ring.advance()
         self.stop_vad_stream()
 
         # write to temp WAV file
@@ -79,7 +120,9 @@ class AudioModule:
             wf.setnchannels(self.CHANNELS)
             wf.setsampwidth(self.SAMPLE_WIDTH)
             wf.setframerate(self.SAMPLE_RATE)
-            wf.writeframes(bytes(buffer))
+            # nframes known up front: the header is written once, no seek-back patch
+            wf.setnframes(used // (self.CHANNELS * self.SAMPLE_WIDTH))
+            wf.writeframesraw(view[:used])
 
         return path
 
@@ -95,23 +138,24 @@ class AudioModule:
         self._vad_running = False
         if self._vad_thread:
             self._vad_thread.join()
-        # clear queue
-        while not self.frame_queue.empty():
-            _ = self.frame_queue.get_nowait()
+        self._frames.clear()
 
     def _vad_reader(self):
         with pasimple.PaSimple(pasimple.PA_STREAM_RECORD,
                                self.FORMAT,
                                self.CHANNELS,
                                self.SAMPLE_RATE) as pa:
+            # refilled in place each read; push() copies the frame into its ring slot
+            reader = PaReader(pa, bytearray(self.FRAME_BYTES))
+            frame = reader.buf
             while self._vad_running:
-                frame = pa.read(self.FRAME_BYTES)
-                if len(frame) < self.FRAME_BYTES:
+                if reader.readinto() < self.FRAME_BYTES:
                     break
-                is_speech = self.vad.is_speech(frame, self.SAMPLE_RATE)
-                self.loop.call_soon_threadsafe(
-                    self.frame_queue.put_nowait, (frame, is_speech)
-                )
+                is_speech = self._energy_gate.passes(frame) and self.vad.is_speech(frame, self.SAMPLE_RATE)
+                if self.loop is None:
+                    continue
+                self._frames.push(frame, is_speech)
+                self._frames.notify()
         self._vad_running = False
 
     # ── Single-shot playback ────────────────────────────────────────────────
@@ -140,6 +184,8 @@ class AudioModule:
         with self._sched_cond:
             heapq.heappush(self._schedule_queue, (-priority, self._counter, task))
             self._counter += 1
+            if self._current_task and priority > self._current_task.priority:
+                self._wake_scheduler()
             self._sched_cond.notify()
         return play_id
 
@@ -148,12 +194,18 @@ class AudioModule:
         Stop a scheduled or currently playing sound by play_id.
         """
         with self._sched_cond:
-            self._schedule_queue = [item for item in self._schedule_queue if item[2].play_id != play_id]
-            heapq.heapify(self._schedule_queue)
             if self._current_task and self._current_task.play_id == play_id:
                 if self._current_task.process:
                     self._current_task.process.kill()
                 self._current_task = None
+            else:
+                self._stopped_pids.add(play_id)
+                if len(self._stopped_pids) > len(self._schedule_queue) // 2:
+                    # mostly tombstones (or unknown ids): compact once
+                    self._schedule_queue = [item for item in self._schedule_queue
+                                            if item[2].play_id not in self._stopped_pids]
+                    heapq.heapify(self._schedule_queue)
+                    self._stopped_pids.clear()
             self._paused_tasks.discard(play_id)
             self._sched_cond.notify()
 
@@ -211,28 +263,29 @@ class AudioModule:
             for pid in list(self._paused_tasks):
                 self.resume_sound(pid)
 
+    def _live_head(self):
+        # caller holds _sched_cond; pops stopped entries sitting on top of the heap
+        heap = self._schedule_queue
+        while heap and heap[0][2].play_id in self._stopped_pids:
+            self._stopped_pids.discard(heapq.heappop(heap)[2].play_id)
+        return heap[0] if heap else None
+
     def _scheduler_loop(self):
-        self._scheduler_running = True
-        while self._scheduler_running:
+        stop = self._sched_stop
+        while not stop.is_set():
             with self._sched_cond:
-                while not self._schedule_queue and self._scheduler_running:
-                    self._sched_cond.wait()
-                if not self._scheduler_running:
+                self._sched_cond.wait_for(lambda: self._live_head() is not None or stop.is_set())
+                if stop.is_set():
                     break
                 _, _, task = heapq.heappop(self._schedule_queue)
                 self._current_task = task
 
-            while self._scheduler_running and self._current_task:
-                proc = subprocess.Popen(["paplay", task.path])
+            while not stop.is_set() and self._current_task:
+                proc = subprocess.Popen([_PAPLAY, task.path], close_fds=False)
                 task.process = proc
                 # ensure not paused
                 self._paused_tasks.discard(task.play_id)
-                while proc.poll() is None:
-                    time.sleep(0.1)
-                    with self._sched_cond:
-                        if self._schedule_queue and -self._schedule_queue[0][0] > task.priority:
-                            proc.kill()
-                            break
+                self._wait_or_preempt(proc, task)
                 if self._current_task and task.loop and proc.returncode == 0:
                     continue
                 with self._sched_cond:
@@ -252,10 +305,48 @@ class AudioModule:
         Stop the scheduler and all playback.
         """
         with self._sched_cond:
-            self._scheduler_running = False
+            self._sched_stop.set()
+            self._wake_scheduler()
             self._sched_cond.notify_all()
         self._scheduler_thread.join()
 
+    def _wake_scheduler(self):
+        try:
+            os.write(self._preempt_w, b'\0')
+        except BlockingIOError:
+            pass  # a wake-up is already pending
+
+    def _wait_or_preempt(self, proc, task):
+        """
+        Block until `proc` exits, or kill it once a higher-priority sound is
+        queued or the scheduler is stopping. Waits on the child's pidfd and the
+        preempt pipe, so there is no polling while a sound plays.
+        """
+        try:
+            pidfd = os.pidfd_open(proc.pid)
+        except (AttributeError, OSError):
+            pidfd = None  # pre-5.3 kernel: fall back to a 100 ms poll
+        try:
+            with selectors.DefaultSelector() as sel:
+                if pidfd is not None:
+                    sel.register(pidfd, selectors.EVENT_READ)
+                sel.register(self._preempt_r, selectors.EVENT_READ)
+                while proc.poll() is None:
+                    sel.select(None if pidfd is not None else 0.1)
+                    try:
+                        os.read(self._preempt_r, 64)
+                    except BlockingIOError:
+                        pass
+                    with self._sched_cond:
+                        head = self._live_head()
+                        if self._sched_stop.is_set() or (head and -head[0] > task.priority):
+                            proc.kill()
+                            break
+        finally:
+            if pidfd is not None:
+                os.close(pidfd)
+        proc.wait()
+
 
 # ── Example usage demonstrating all functions ───────────────────────────
 if __name__ == '__main__':
@@ -1,15 +1,56 @@
 import pasimple
 import webrtcvad
 import wave
+import struct
+import io
 import asyncio
+import logging
 import subprocess
 import threading
 import signal
-import heapq
+import bisect
 import uuid
 import time
 import os
-from collections import deque
+import queue
+import shutil
+from collections import deque, OrderedDict
+
+import numpy as np
+
+from audio.energy import EnergyGate
+from audio.pa_read import PaReader
+from audio.ring import SpscRing, PrerollRing
+from audio.silero import SileroVad
+
+logger = logging.getLogger(__name__)
+
+# Recycled record() buffers, keyed by size, so the utterance-sized allocation
+# is paid once per process rather than once per record.
+_BUFFER_POOL = {}
+_BUFFER_POOL_LOCK = threading.Lock()
+
+def _take_buffer(size: int) -> bytearray:
+    with _BUFFER_POOL_LOCK:
+        free = _BUFFER_POOL.get(size)
+        if free:
+            return free.pop()
+    return bytearray(size)
+
+def _give_buffer(buf: bytearray):
+    with _BUFFER_POOL_LOCK:
+        _BUFFER_POOL.setdefault(len(buf), []).append(buf)
+
+def _detect_player() -> list:
+    # Subprocess player for files we can't stream ourselves. pw-cat talks to
+    # PipeWire natively instead of through its Pulse shim; aplay goes straight
+    # to ALSA but only understands WAV/raw, so it is the last resort.
+    # Resolved to absolute paths once, so launches skip the PATH search.
+    for cmd in (['pw-cat', '--playback'], ['paplay'], ['aplay', '-q']):
+        exe = shutil.which(cmd[0])
+        if exe:
+            return [exe, *cmd[1:]]
+    return ['/usr/bin/paplay']
 
 # ── AudioModule: continuous VAD capture, priority scheduler, FIFO queue & concurrent ───
 class AudioModule:
@@ -20,6 +61,13 @@ class AudioModule:
         sample_rate=16000,
         frame_ms=30,
         vad_aggressiveness=1,
+        vad_batch=4,
+        endpoint_tolerance=2,
+        max_utterance_ms=30000,
+        vad_backend="webrtc",
+        silero_model="silero_vad.onnx",
+        preroll_ms=150,
+        pcm_cache_bytes=8 * 1024 * 1024,
     ):
         # Recording/VAD config
         self.FORMAT = format
@@ -28,140 +76,477 @@ class AudioModule:
         self.SAMPLE_WIDTH = pasimple.format2width(format)
         self.FRAME_MS = frame_ms
         self.FRAME_BYTES = int(sample_rate * frame_ms / 1000) * self.SAMPLE_WIDTH * channels
+        # frames pulled per pa.read(); the VAD still sees them one at a time
+        self.VAD_BATCH = vad_batch
+        # speech frames allowed inside the trailing silence window before
+        # record() still calls the utterance finished (coughs, clicks, VAD flicker)
+        self.ENDPOINT_TOLERANCE = endpoint_tolerance
+        # record() stops at this length even if the speaker hasn't paused
+        self.MAX_UTTERANCE_BYTES = max_utterance_ms // frame_ms * self.FRAME_BYTES
 
         # VAD
         self.vad = webrtcvad.Vad(vad_aggressiveness)
+        self._energy_gate = EnergyGate()
+        # "silero" flags whole read chunks with the Silero ONNX model instead
+        # (needs onnxruntime); it sees every sample, so the energy gate is skipped
+        if vad_backend not in ("webrtc", "silero"):
+            raise ValueError(f"unknown vad_backend {vad_backend!r}")
+        self._vad_backend = vad_backend
+        self._silero = SileroVad(silero_model, sample_rate) if vad_backend == "silero" else None
         self._vad_running = False
-        self.loop = asyncio.get_event_loop()
-        self.frame_queue = asyncio.Queue()
+        self._vad_thread = None
+        self.loop = None  # bound to the running loop by record()
+        self._record_req = None  # (silence_frames, speech_frames, tmp_dir, future, on_speech, on_pause, pause_frames)
+        # frames heard just before speech starts, prepended so onsets aren't clipped
+        self._preroll = PrerollRing(max(1, preroll_ms // frame_ms), self.FRAME_BYTES)
 
         # Priority scheduler
         self._sched_cond = threading.Condition()
-        self._schedule_queue = []
-        self._counter = 0
+        # priorities are few and repeat, so each gets a FIFO deque; _priorities
+        # keeps the non-empty ones sorted and the scheduler takes from the top
+        self._buckets = {}       # priority -> deque of ScheduledSound
+        self._priorities = []
+        self._queued = 0
+        self._cancelled = set()  # play_ids stopped while still queued; skipped on pop
+        self._ss_pool = []       # finished ScheduledSound objects, reused by schedule()
+        self._sound_waiters = {} # play_id -> futures from wait_sound()
         self._current_task = None
+        self._playing_id = None  # published by the scheduler for lock-free list_playing()
         self._paused_tasks = set()
         self._scheduler_thread = threading.Thread(target=self._scheduler_loop, daemon=True)
-        self._scheduler_running = False
+        self._sched_stop = threading.Event()
 
-        # FIFO queue playback
-        self._audio_queue = deque()
-        self._queue_lock = threading.Lock()
-        self._queue_event = threading.Event()
+        # FIFO queue playback: lock-free ring of (generation, path); the event
+        # loop is the single producer and _queue_worker the single consumer.
+        # force_queue_play bumps the generation, which retires everything older.
+        self._audio_queue = SpscRing(256)
+        self._queue_gen = 0
         self._queue_running = True
         self._queue_current = None
         self._queue_process = None
+        self._queue_waiters = []  # futures from wait_queue(), guarded by _queue_waiters_lock
+        self._queue_waiters_lock = threading.Lock()
         self._queue_thread = threading.Thread(target=self._queue_worker, daemon=True)
         self._queue_thread.start()
 
-        # Concurrent playback
+        # Concurrent playback: int16 WAVs are summed by one mixer thread into a
+        # stream per (channels, rate); anything else gets its own stream/player.
         self._concurrent = {}
+        self._mix_sounds = {}
         self._concurrent_lock = threading.Lock()
+        self._mix_ready = threading.Event()
+        self._mix_stop = None    # stop Event of the running mixer thread, one per thread
+        self._mixer_thread = None
+
+        # Persistent PulseAudio playback streams, keyed by (lane, format, channels, rate).
+        # Each lane is only ever written from its own worker thread.
+        self._playback_streams = {}
+        self._player_cmd = _detect_player()
+
+        # Decoded PCM of recently played clips, LRU by total size. Keyed by
+        # (path, mtime) so a re-rendered TTS file is never served stale.
+        self._pcm_cache = OrderedDict()
+        self._pcm_cache_size = 0
+        self._pcm_cache_budget = pcm_cache_bytes
+        self._pcm_cache_lock = threading.Lock()
+
+        # Capture runs for the module's lifetime; record() only gates what is kept.
+        self.start_vad_stream()
 
     ##### VAD-based record #####
-    async def record(self, silence_duration: float = 1.0, tmp_dir: str = 'tmp', min_speech_duration=0.3) -> str:
-        self.start_vad_stream()
-        buffer = bytearray()
-        in_speech = 0
-        silence_count = 0
+    async def record(self, silence_duration: float = 1.0, tmp_dir: str = 'tmp', min_speech_duration=0.3,
+                     in_memory: bool = False, on_speech=None, on_pause=None, pause_duration: float = 0.3):
+        """
+        Wait for one utterance and return the path of its WAV file in tmp_dir,
+        or with in_memory=True the WAV file's bytes, skipping the disk round trip.
+
+        on_speech() is called on the loop once, when the utterance starts.
+        on_pause() is called on the loop each time the speaker has been quiet
+        for pause_duration once speech started, i.e. early in the silence that
+        may end the utterance; work started there overlaps the endpoint wait.
+        """
+        if in_memory:
+            tmp_dir = None
         threshold = int((silence_duration * 1000) / self.FRAME_MS)
         speech_threshold = int((min_speech_duration * 1000) / self.FRAME_MS)
-        while True:
-            frame, is_speech = await self.frame_queue.get()
-            if is_speech:
-                in_speech += 1 # +True
-                buffer.extend(frame)
-                silence_count = 0
-            elif in_speech > speech_threshold:
-                buffer.extend(frame)
-                silence_count += 1
-                if silence_count >= threshold:
-                    break
-        self.stop_vad_stream()
-        file_id = str(uuid.uuid4())
-        path = os.path.join(tmp_dir, f"{file_id}.wav")
-        os.makedirs(tmp_dir, exist_ok=True)
-        with wave.open(path, 'wb') as wf:
-            wf.setnchannels(self.CHANNELS)
-            wf.setsampwidth(self.SAMPLE_WIDTH)
-            wf.setframerate(self.SAMPLE_RATE)
-            wf.writeframes(bytes(buffer))
-        return path
+        pause_frames = max(1, int((pause_duration * 1000) / self.FRAME_MS))
+        self.loop = asyncio.get_running_loop()
+        fut = self.loop.create_future()
+        self._record_req = (threshold, speech_threshold, tmp_dir, fut, on_speech, on_pause, pause_frames)
+        self.start_vad_stream()  # no-op unless capture died or was stopped
+        try:
+            # the VAD thread runs the speech/silence state machine and resolves this once
+            return await fut
+        finally:
+            self._record_req = None
 
     def start_vad_stream(self):
-        if self._vad_running:
+        if self._vad_running and self._vad_thread and self._vad_thread.is_alive():
             return
         self._vad_running = True
-        threading.Thread(target=self._vad_reader, daemon=True).start()
+        self._vad_thread = threading.Thread(target=self._vad_reader, daemon=True)
+        self._vad_thread.start()
 
     def stop_vad_stream(self):
         self._vad_running = False
-        while not self.frame_queue.empty():
-            self.frame_queue.get_nowait()
 
     def _vad_reader(self):
-        with pasimple.PaSimple(pasimple.PA_STREAM_RECORD, self.FORMAT, self.CHANNELS, self.SAMPLE_RATE) as pa:
-            while self._vad_running:
-                frame = pa.read(self.FRAME_BYTES)
-                if len(frame) < self.FRAME_BYTES:
-                    break
-                is_speech = self.vad.is_speech(frame, self.SAMPLE_RATE)
-                self.loop.call_soon_threadsafe(self.frame_queue.put_nowait, (frame, is_speech))
-        self._vad_running = False
+        me = threading.current_thread()
+        preroll = self._preroll
+        buffer = _take_buffer(self.MAX_UTTERANCE_BYTES)
+        req = None
+        done = False
+        try:
+            with pasimple.PaSimple(pasimple.PA_STREAM_RECORD, self.FORMAT, self.CHANNELS, self.SAMPLE_RATE) as pa:
+                fb = self.FRAME_BYTES
+                # one read buffer for the life of the stream; frames are views into
+                # it, so anything kept past the next read is copied (preroll, buffer)
+                reader = PaReader(pa, bytearray(fb * self.VAD_BATCH))
+                chunk = memoryview(reader.buf)
+                silero = self._silero
+                gate = self._energy_gate
+                if silero is not None:
+                    silero.reset()
+                    frame_samples = fb // (self.SAMPLE_WIDTH * self.CHANNELS)
+                while self._vad_running and self._vad_thread is me:
+                    n = reader.readinto()
+                    if silero is not None:
+                        flags = silero.speech_flags(chunk[:n], frame_samples)
+                    for off in range(0, n - fb + 1, fb):
+                        frame = chunk[off:off + fb]
+                        if self._record_req is not req:
+                            # record() started, finished or was cancelled
+                            req = self._record_req
+                            done = started = paused = False
+                            # hist: one bit per frame, newest in bit 0
+                            used = heard = hist = 0
+                            if req is not None:
+                                threshold, speech_threshold, tmp_dir, fut, on_speech, on_pause, pause_frames = req
+                                hist_mask = (1 << max(64, threshold, speech_threshold + 1, pause_frames)) - 1
+                                tail_mask = (1 << threshold) - 1
+                                pause_mask = (1 << pause_frames) - 1
+                        if req is None or done:
+                            # idle: nobody is listening, so skip the VAD; the gate
+                            # only needs its calibration frames from this path
+                            if gate.floor is None and silero is None:
+                                gate.passes(frame)
+                            preroll.append(frame)
+                            continue
+                        if silero is not None:
+                            is_speech = flags[off // fb]
+                        else:
+                            is_speech = gate.passes(frame) and self.vad.is_speech(frame, self.SAMPLE_RATE)
+                        hist = ((hist << 1) | bool(is_speech)) & hist_mask
+                        if is_speech:
+                            if not used:
+                                used = preroll.drain_into(buffer, used)
+                            buffer[used:used + fb] = frame
+                            used += fb
+                            heard += 1
+                        elif started:
+                            buffer[used:used + fb] = frame
+                            used += fb
+                            heard += 1
+                        else:
+                            if not hist:
+                                used = heard = 0  # blips that never became speech
+                            preroll.append(frame)
+                            continue
+                        # started once the window holds more than speech_threshold speech frames
+                        if not started:
+                            started = hist.bit_count() > speech_threshold
+                            if not started:
+                                if used + fb > len(buffer):
+                                    used = heard = 0
+                                continue
+                            if on_speech is not None:
+                                self.loop.call_soon_threadsafe(on_speech)
+                        # once per pause: re-armed by the next speech frame
+                        if on_pause is not None:
+                            if is_speech:
+                                paused = False
+                            elif not paused and not hist & pause_mask:
+                                paused = True
+                                self.loop.call_soon_threadsafe(on_pause)
+                        # end once the last `threshold` frames hold at most
+                        # ENDPOINT_TOLERANCE speech frames (a popcount, not a run length)
+                        if (heard >= threshold and (hist & tail_mask).bit_count() <= self.ENDPOINT_TOLERANCE) \
+                                or used + fb > len(buffer):
+                            pcm = memoryview(buffer)[:used]
+                            result = self._wav_bytes(pcm) if tmp_dir is None else self._write_wav(pcm, tmp_dir)
+                            if self.loop is not None:
+                                self.loop.call_soon_threadsafe(self._resolve, fut, result, None)
+                            done = True
+                    if n < len(chunk):
+                        break
+        except Exception as e:
+            # logged here too: with no record() pending nobody else would see it
+            logger.exception("VAD capture stopped")
+            req = self._record_req
+            if req is not None and self.loop is not None:
+                self.loop.call_soon_threadsafe(self._resolve, req[3], None, e)
+        finally:
+            _give_buffer(buffer)
+            if self._vad_thread is me:
+                self._vad_running = False
+
+    @staticmethod
+    def _resolve(fut, result, exc):
+        if fut.done():
+            return
+        if exc is not None:
+            fut.set_exception(exc)
+        else:
+            fut.set_result(result)
+
+    def _write_wav(self, buffer, tmp_dir: str) -> str:
+        file_id = str(uuid.uuid4())
+        path = os.path.join(tmp_dir, f"{file_id}.wav")
+        os.makedirs(tmp_dir, exist_ok=True)
+        if self.FORMAT == pasimple.PA_SAMPLE_S16LE:
+            # PCM16: write the 44-byte RIFF header ourselves and the samples
+            # straight from the caller's buffer, without a bytes() copy
+            with open(path, 'wb') as f:
+                f.write(self._wav_header(len(buffer)))
+                f.write(buffer)
+            return path
+        with wave.open(path, 'wb') as wf:
+            self._write_frames(wf, buffer)
+        return path
+
+    def _wav_bytes(self, buffer) -> bytes:
+        """The WAV file _write_wav would write, built in memory."""
+        if self.FORMAT == pasimple.PA_SAMPLE_S16LE:
+            return b''.join((self._wav_header(len(buffer)), buffer))
+        out = io.BytesIO()
+        with wave.open(out, 'wb') as wf:
+            self._write_frames(wf, buffer)
+        return out.getvalue()
+
+    def _wav_header(self, size: int) -> bytes:
+        block_align = self.CHANNELS * self.SAMPLE_WIDTH
+        return struct.pack(
+            '<4sI4s4sIHHIIHH4sI',
+            b'RIFF', 36 + size, b'WAVE',
+            b'fmt ', 16, 1, self.CHANNELS, self.SAMPLE_RATE,
+            self.SAMPLE_RATE * block_align, block_align, self.SAMPLE_WIDTH * 8,
+            b'data', size,
+        )
+
+    def _write_frames(self, wf, buffer):
+        wf.setnchannels(self.CHANNELS)
+        wf.setsampwidth(self.SAMPLE_WIDTH)
+        wf.setframerate(self.SAMPLE_RATE)
+        # nframes known up front: the header is written once, no seek-back patch
+        wf.setnframes(len(buffer) // (self.CHANNELS * self.SAMPLE_WIDTH))
+        wf.writeframesraw(buffer)
 
     ##### FIFO queue #####
     def add_audio_to_queue(self, path: str):
-        with self._queue_lock:
-            self._audio_queue.append(path)
-            self._queue_event.set()
+        if not self._audio_queue.push((self._queue_gen, path)):
+            raise queue.Full("audio queue is full")
+
+    def flush_queue(self):
+        """Drop everything queued and cut off the clip that is playing."""
+        self._queue_gen += 1
+        proc = self._queue_process
+        if proc:
+            proc.kill()
 
     def force_queue_play(self, path: str):
-        with self._queue_lock:
-            if self._queue_process:
-                self._queue_process.kill()
-            self._audio_queue.clear()
-            self._audio_queue.appendleft(path)
-            self._queue_event.set()
+        self.flush_queue()
+        self.add_audio_to_queue(path)
 
     def list_queue(self) -> list:
-        with self._queue_lock:
-            return list(self._audio_queue)
+        gen = self._queue_gen
+        return [path for g, path in self._audio_queue.snapshot() if g == gen]
 
     def list_queue_playing(self) -> list:
-        with self._queue_lock:
-            return [self._queue_current] if self._queue_current else []
+        current = self._queue_current
+        return [current] if current else []
 
     def _queue_worker(self):
+        ring = self._audio_queue
         while self._queue_running:
-            self._queue_event.wait()
-            while True:
-                with self._queue_lock:
-                    if not self._audio_queue:
-                        self._queue_event.clear()
-                        break
-                    path = self._audio_queue.popleft()
-                    self._queue_current = path
-                proc = subprocess.Popen(["paplay", path])
-                with self._queue_lock:
-                    self._queue_process = proc
-                proc.wait()
-                with self._queue_lock:
+            ring.ready.wait()
+            ring.ready.clear()
+            while self._queue_running:
+                # pop and claim in one critical section: wait_queue must never
+                # see an empty ring with nothing marked as playing in between
+                with self._queue_waiters_lock:
+                    item = ring.pop()
+                    if item is not None:
+                        self._queue_current = item[1]
+                if item is None:
+                    break
+                gen, path = item
+                if gen != self._queue_gen:
                     self._queue_current = None
-                    self._queue_process = None
+                    continue  # retired by force_queue_play
+                played = self._stream_wav(
+                    'queue', path,
+                    lambda: gen != self._queue_gen or not self._queue_running,
+                )
+                if played is None:
+                    proc = self._spawn_player(path)
+                    self._queue_process = proc
+                    if gen != self._queue_gen:
+                        proc.kill()  # forced while spawning
+                    proc.wait()
+                self._queue_current = None
+                self._queue_process = None
+            with self._queue_waiters_lock:
+                if not len(ring):
+                    self._wake(self._queue_waiters)
+                    self._queue_waiters = []
+        self._close_streams('queue')
+
+    async def wait_queue(self):
+        """Wait until the FIFO queue has nothing left to play."""
+        fut = asyncio.get_running_loop().create_future()
+        with self._queue_waiters_lock:
+            if not len(self._audio_queue) and self._queue_current is None:
+                return
+            self._queue_waiters.append(fut)
+        await fut
 
     def stop_queue(self):
         self._queue_running = False
-        self._queue_event.set()
+        self._audio_queue.ready.set()
         self._queue_thread.join()
 
+    ##### In-process playback #####
+    def _playback_stream(self, lane: str, fmt: int, channels: int, rate: int):
+        key = (lane, fmt, channels, rate)
+        pa = self._playback_streams.get(key)
+        if pa is None:
+            # ~100 ms server-side buffer so stop/preempt never has seconds of audio queued
+            tlength = rate * channels * pasimple.format2width(fmt) // 10
+            pa = pasimple.PaSimple(pasimple.PA_STREAM_PLAYBACK, fmt, channels, rate, tlength=tlength)
+            self._playback_streams[key] = pa
+        return pa
+
+    def _close_streams(self, lane: str):
+        # list() snapshots the keys atomically; other lanes may be inserting
+        for key in [k for k in list(self._playback_streams) if k[0] == lane]:
+            self._playback_streams.pop(key).close()
+
+    def _spawn_player(self, path: str) -> subprocess.Popen:
+        # absolute argv[0], close_fds=False and no cwd/env/preexec_fn let CPython
+        # start the child with posix_spawn rather than fork+exec; our own fds are
+        # all O_CLOEXEC, so nothing leaks into the player
+        return subprocess.Popen([*self._player_cmd, path], close_fds=False)
+
+    def _load_pcm(self, path: str):
+        """
+        (pcm, format, channels, rate) for a PCM WAV small enough to cache,
+        served from the LRU when the file hasn't changed. None otherwise.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        # larger files are streamed from disk instead
+        if st.st_size > self._pcm_cache_budget // 4:
+            return None
+        key = (path, st.st_mtime_ns)
+        with self._pcm_cache_lock:
+            entry = self._pcm_cache.get(key)
+            if entry is not None:
+                self._pcm_cache.move_to_end(key)
+                return entry
+        try:
+            with wave.open(path, 'rb') as wf:
+                fmt = pasimple.width2format(wf.getsampwidth())
+                entry = (wf.readframes(wf.getnframes()), fmt, wf.getnchannels(), wf.getframerate())
+        except (wave.Error, EOFError, OSError, KeyError):
+            return None
+        with self._pcm_cache_lock:
+            if key not in self._pcm_cache:
+                self._pcm_cache[key] = entry
+                self._pcm_cache_size += len(entry[0])
+                while self._pcm_cache_size > self._pcm_cache_budget:
+                    _, old = self._pcm_cache.popitem(last=False)
+                    self._pcm_cache_size -= len(old[0])
+        return entry
+
+    def preload(self, path: str) -> bool:
+        """
+        Decode a WAV into the PCM cache ahead of its first play, so a prompt
+        sound never pays the file read and decode on the hot path. Returns
+        False for files the cache won't hold (they stream from disk instead).
+        """
+        return self._load_pcm(path) is not None
+
+    def _stream_wav(self, lane: str, path: str, interrupted, resumed: threading.Event = None):
+        """
+        Play a PCM WAV on the lane's persistent stream in 20 ms chunks.
+        Returns True when played to the end, False when interrupted, and
+        None when the file can't be streamed in-process (caller falls back to a player subprocess).
+        """
+        entry = self._load_pcm(path)
+        if entry is not None:
+            return self._stream_pcm(lane, entry, interrupted, resumed)
+        return self._stream_file(lane, path, interrupted, resumed)
+
+    def _stream_file(self, lane: str, path: str, interrupted, resumed: threading.Event = None):
+        """Uncached `_stream_wav`: read the WAV from disk chunk by chunk."""
+        try:
+            wf = wave.open(path, 'rb')
+        except (wave.Error, EOFError, OSError):
+            return None
+        with wf:
+            try:
+                fmt = pasimple.width2format(wf.getsampwidth())
+            except KeyError:
+                return None
+            pa = self._playback_stream(lane, fmt, wf.getnchannels(), wf.getframerate())
+            chunk = max(1, wf.getframerate() // 50)
+            while True:
+                if resumed is not None and not resumed.is_set():
+                    resumed.wait()
+                if interrupted():
+                    pa.flush()
+                    return False
+                data = wf.readframes(chunk)
+                if not data:
+                    break
+                pa.write(data)
+            pa.drain()
+        return True
+
+    def _stream_pcm(self, lane: str, entry, interrupted, resumed: threading.Event = None) -> bool:
+        """Play a decoded `_load_pcm` entry; same contract as `_stream_wav`."""
+        pcm, fmt, channels, rate = entry
+        pa = self._playback_stream(lane, fmt, channels, rate)
+        step = max(1, rate // 50) * channels * pasimple.format2width(fmt)
+        for off in range(0, len(pcm), step):
+            if resumed is not None and not resumed.is_set():
+                resumed.wait()
+            if interrupted():
+                pa.flush()
+                return False
+            pa.write(pcm[off:off + step])
+        pa.drain()
+        return True
+
     ##### Priority scheduler #####
     class ScheduledSound:
+        __slots__ = ('path', 'priority', 'loop', 'play_id', 'process', 'stopped', 'resumed', 'pcm')
+
         def __init__(self, path, priority, loop, play_id):
+            self.resumed = threading.Event()
+            self.reset(path, priority, loop, play_id)
+
+        def reset(self, path, priority, loop, play_id):
             self.path = path
             self.priority = priority
             self.loop = loop
             self.play_id = play_id
-            self.process = None
+            self.process = None          # only set for the subprocess fallback
+            self.stopped = False
+            self.pcm = None              # cached _load_pcm entry, resolved on first play
+            self.resumed.set()
 
     def play(self, path: str, priority: int = 0) -> str:
         return self.schedule(path, priority, loop=False)
@@ -171,75 +556,177 @@ class AudioModule:
 
     def schedule(self, path: str, priority: int = 0, loop: bool = False) -> str:
         pid = str(uuid.uuid4())
-        task = AudioModule.ScheduledSound(path, priority, loop, pid)
         with self._sched_cond:
-            heapq.heappush(self._schedule_queue, (-priority, self._counter, task))
-            self._counter += 1
+            if self._ss_pool:
+                task = self._ss_pool.pop()
+                task.reset(path, priority, loop, pid)
+            else:
+                task = AudioModule.ScheduledSound(path, priority, loop, pid)
+            bucket = self._buckets.get(priority)
+            if bucket is None:
+                bucket = self._buckets[priority] = deque()
+                bisect.insort(self._priorities, priority)
+            bucket.append(task)
+            self._queued += 1
             self._sched_cond.notify()
         return pid
 
     def pause_sound(self, pid: str):
-        if self._current_task and self._current_task.play_id == pid:
-            self._current_task.process.send_signal(signal.SIGSTOP)
+        task = self._current_task
+        if task and task.play_id == pid:
+            if task.process:
+                task.process.send_signal(signal.SIGSTOP)
+            else:
+                task.resumed.clear()
             self._paused_tasks.add(pid)
 
     def resume_sound(self, pid: str):
         if pid in self._paused_tasks:
-            self._current_task.process.send_signal(signal.SIGCONT)
+            task = self._current_task
+            if task and task.play_id == pid:
+                if task.process:
+                    task.process.send_signal(signal.SIGCONT)
+                else:
+                    task.resumed.set()
             self._paused_tasks.remove(pid)
 
     def stop_sound(self, pid: str):
         with self._sched_cond:
-            # remove pending
-            self._schedule_queue = [t for t in self._schedule_queue if t[2].play_id != pid]
-            heapq.heapify(self._schedule_queue)
             # if currently playing, kill and disable loop
             if self._current_task and self._current_task.play_id == pid:
                 if self._current_task.process:
                     self._current_task.process.kill()
                 # prevent restart
                 self._current_task.loop = False
+                self._current_task.stopped = True
+                self._current_task.resumed.set()
                 self._current_task = None
+                self._playing_id = None
+            else:
+                # tombstone pending entries; compact once they dominate the queue
+                self._cancelled.add(pid)
+                self._wake(self._sound_waiters.pop(pid, ()))
+                if len(self._cancelled) > self._queued // 2:
+                    for priority in list(self._priorities):
+                        bucket = self._buckets[priority]
+                        live = deque()
+                        for task in bucket:
+                            if task.play_id in self._cancelled:
+                                self._recycle(task)
+                            else:
+                                live.append(task)
+                        self._queued -= len(bucket) - len(live)
+                        if live:
+                            self._buckets[priority] = live
+                        else:
+                            del self._buckets[priority]
+                            self._priorities.remove(priority)
+                    self._cancelled.clear()
             self._sched_cond.notify()
 
     def list_playing(self) -> list:
-        with self._sched_cond:
-            if self._current_task and self._current_task.process.poll() is None:
-                return [self._current_task.play_id]
-            return []
+        pid = self._playing_id
+        return [pid] if pid else []
 
     def list_paused(self) -> list:
         return list(self._paused_tasks)
 
     def clear_schedule(self):
         with self._sched_cond:
-            self._schedule_queue.clear()
+            self._buckets.clear()
+            self._priorities.clear()
+            self._queued = 0
+            self._cancelled.clear()
+            current = self._current_task.play_id if self._current_task else None
+            for pid in [p for p in self._sound_waiters if p != current]:
+                self._wake(self._sound_waiters.pop(pid))
             self._sched_cond.notify()
 
+    async def wait_sound(self, pid: str):
+        """Wait until a scheduled sound has finished, been stopped or been dropped."""
+        fut = asyncio.get_running_loop().create_future()
+        with self._sched_cond:
+            task = self._current_task
+            pending = (task is not None and task.play_id == pid) or (
+                pid not in self._cancelled
+                and any(t.play_id == pid for bucket in self._buckets.values() for t in bucket)
+            )
+            if not pending:
+                return
+            self._sound_waiters.setdefault(pid, []).append(fut)
+        await fut
+
+    @staticmethod
+    def _wake(futures):
+        # futures belong to whichever loop awaited them; resolve on that loop
+        for fut in futures:
+            fut.get_loop().call_soon_threadsafe(AudioModule._resolve, fut, None, None)
+
+    def _pop_scheduled(self):
+        # caller holds _sched_cond
+        while self._priorities:
+            priority = self._priorities[-1]
+            bucket = self._buckets[priority]
+            task = bucket.popleft()
+            if not bucket:
+                del self._buckets[priority]
+                self._priorities.pop()
+            self._queued -= 1
+            if task.play_id in self._cancelled:
+                self._cancelled.discard(task.play_id)
+                self._recycle(task)
+                continue
+            return task
+        return None
+
+    def _recycle(self, task):
+        # caller holds _sched_cond
+        if len(self._ss_pool) < 64:
+            task.process = None
+            task.pcm = None
+            self._ss_pool.append(task)
+
     def _scheduler_loop(self):
-        self._scheduler_running = True
-        while self._scheduler_running:
+        stop = self._sched_stop
+        while not stop.is_set():
             with self._sched_cond:
-                while not self._schedule_queue and self._scheduler_running:
-                    self._sched_cond.wait()
-                if not self._scheduler_running:
+                task = None
+                while task is None and not stop.is_set():
+                    self._sched_cond.wait_for(lambda: self._priorities or stop.is_set())
+                    task = self._pop_scheduled()
+                if stop.is_set():
                     break
-                _, _, task = heapq.heappop(self._schedule_queue)
                 self._current_task = task
+                self._playing_id = task.play_id
 
             # play at least once, then loop if requested
-            while self._scheduler_running:
-                proc = subprocess.Popen(["paplay", task.path])
-                task.process = proc
+            while not stop.is_set():
                 self._paused_tasks.discard(task.play_id)
-                proc.wait()
+                interrupted = lambda: task.stopped or stop.is_set()
+                # resolve the cache once; loop iterations replay the same PCM
+                if task.pcm is None:
+                    task.pcm = self._load_pcm(task.path)
+                if task.pcm is not None:
+                    played = self._stream_pcm('sched', task.pcm, interrupted, task.resumed)
+                else:
+                    played = self._stream_file('sched', task.path, interrupted, task.resumed)
+                if played is None:
+                    proc = self._spawn_player(task.path)
+                    task.process = proc
+                    proc.wait()
                 # break if not looping or shutdown requested
-                if not task.loop or not self._scheduler_running:
+                if not task.loop or stop.is_set():
                     break
-            self._current_task = None
+            with self._sched_cond:
+                if self._current_task is task:
+                    self._current_task = None
+                    self._playing_id = None
+                self._wake(self._sound_waiters.pop(task.play_id, ()))
+                self._recycle(task)
         # cleanup on exit
         if self._current_task and self._current_task.process:
             self._current_task.process.kill()
+        self._close_streams('sched')
 
     def start_scheduler(self):
         if not self._scheduler_thread.is_alive():
@@ -247,33 +734,124 @@ class AudioModule:
 
     def stop_scheduler(self):
         with self._sched_cond:
-            self._scheduler_running = False
+            self._sched_stop.set()
+            for futures in self._sound_waiters.values():
+                self._wake(futures)
+            self._sound_waiters.clear()
+            task = self._current_task
+            if task:
+                task.resumed.set()
+                if task.process:
+                    task.process.kill()
             self._sched_cond.notify_all()
         self._scheduler_thread.join()
 
     ##### Concurrent playback #####
+    class MixSound:
+        __slots__ = ('samples', 'pos', 'channels', 'rate')
+
+        def __init__(self, samples, channels, rate):
+            self.samples = samples
+            self.pos = 0
+            self.channels = channels
+            self.rate = rate
+
     def play_concurrent(self, path: str) -> str:
         pid = str(uuid.uuid4())
-        proc = subprocess.Popen(["paplay", path])
+        entry = self._load_pcm(path)
+        if entry is not None and entry[1] == pasimple.PA_SAMPLE_S16LE:
+            pcm, _, channels, rate = entry
+            sound = AudioModule.MixSound(np.frombuffer(pcm, dtype=np.int16), channels, rate)
+            with self._concurrent_lock:
+                self._mix_sounds[pid] = sound
+                if self._mixer_thread is None:
+                    self._mix_stop = threading.Event()
+                    self._mixer_thread = threading.Thread(target=self._mixer_loop,
+                                                          args=(self._mix_stop,), daemon=True)
+                    self._mixer_thread.start()
+            self._mix_ready.set()
+            return pid
+        task = AudioModule.ScheduledSound(path, 0, False, pid)
         with self._concurrent_lock:
-            self._concurrent[pid] = proc
+            self._concurrent[pid] = task
+        threading.Thread(target=self._concurrent_worker, args=(task,), daemon=True).start()
         return pid
 
+    def _mixer_loop(self, stop: threading.Event):
+        while True:
+            self._mix_ready.wait()
+            if stop.is_set():
+                break
+            with self._concurrent_lock:
+                active = list(self._mix_sounds.items())
+                if not active:
+                    self._mix_ready.clear()
+                    continue
+            buses = {}
+            for pid, sound in active:
+                buses.setdefault((sound.channels, sound.rate), []).append((pid, sound))
+            finished = []
+            for (channels, rate), sounds in buses.items():
+                # one 20 ms tick: int32 accumulate, then saturate back to int16
+                n = max(1, rate // 50) * channels
+                mix = np.zeros(n, dtype=np.int32)
+                for pid, sound in sounds:
+                    part = sound.samples[sound.pos:sound.pos + n]
+                    mix[:len(part)] += part
+                    sound.pos += n
+                    if sound.pos >= len(sound.samples):
+                        finished.append(pid)
+                np.clip(mix, -32768, 32767, out=mix)
+                pa = self._playback_stream('mix', pasimple.PA_SAMPLE_S16LE, channels, rate)
+                pa.write(mix.astype(np.int16).tobytes())
+            if finished:
+                with self._concurrent_lock:
+                    for pid in finished:
+                        self._mix_sounds.pop(pid, None)
+        self._close_streams('mix')
+
+    def stop_mixer(self):
+        """Stop the mixer thread, dropping mixed sounds, and close its streams."""
+        with self._concurrent_lock:
+            thread, self._mixer_thread = self._mixer_thread, None
+            self._mix_sounds.clear()
+            if thread is None:
+                return
+            # a later play_concurrent() starts a fresh mixer with its own Event
+            self._mix_stop.set()
+            self._mix_ready.set()
+        thread.join()
+
+    def _concurrent_worker(self, task):
+        # each concurrent sound gets its own stream; the server mixes them
+        lane = f"concurrent:{task.play_id}"
+        try:
+            played = self._stream_wav(lane, task.path, lambda: task.stopped)
+            if played is None and not task.stopped:
+                proc = self._spawn_player(task.path)
+                task.process = proc
+                if task.stopped:
+                    proc.kill()  # stopped while spawning
+                proc.wait()
+        finally:
+            self._close_streams(lane)
+            with self._concurrent_lock:
+                self._concurrent.pop(task.play_id, None)
+
     def stop_concurrent(self, pid: str):
         with self._concurrent_lock:
-            proc = self._concurrent.pop(pid, None)
-        if proc:
-            proc.kill()
+            if self._mix_sounds.pop(pid, None) is not None:
+                return
+            task = self._concurrent.pop(pid, None)
+        if task:
+            task.stopped = True
+            if task.process:
+                task.process.kill()
 
     def list_concurrent(self) -> list:
+        # finished sounds remove themselves, so everything listed is live
         with self._concurrent_lock:
-            live = [pid for pid, proc in self._concurrent.items() if proc.poll() is None]
-            # cleanup
-            for pid in list(self._concurrent):
-                if self._concurrent[pid].poll() is not None:
-                    del self._concurrent[pid]
-            return live
-
+            return [*self._mix_sounds, *self._concurrent]
 
 # ── Example: Power & Simplicity ───────────────────────────────────────────
 if __name__ == '__main__':
@@ -337,5 +915,6 @@ if __name__ == '__main__':
             am.stop_queue()
             print("3")
             am.stop_scheduler()
+            am.stop_mixer()
 
     asyncio.run(main())
@@ -0,0 +1,41 @@
+# audio/pa_read.py
+import ctypes
+
+import pasimple
+
+try:
+    from pasimple.pa_simple import get_libpulse_simple
+except ImportError:  # pasimple layout changed; PaReader falls back to pa.read()
+    get_libpulse_simple = None
+
+class PaReader:
+    """
+    Fills one caller-owned buffer from a pasimple record stream.
+
+    pasimple's read() allocates a bytearray per call and then copies it into
+    a fresh bytes object. PaReader calls pa_simple_read into the same buffer
+    every time instead, so a capture loop allocates nothing per read. When the
+    stream handle isn't reachable it falls back to read() plus a copy.
+    """
+    def __init__(self, pa, buf: bytearray):
+        self.pa = pa
+        self.buf = buf
+        self._n = len(buf)
+        self._stream = getattr(pa, '_stream', None)
+        if self._stream is not None and get_libpulse_simple is not None:
+            self._lib = get_libpulse_simple()
+            self._handle = ctypes.c_void_p(self._stream)
+            self._cbuf = (ctypes.c_char * self._n).from_buffer(buf)
+            self._err = ctypes.c_int(0)
+        else:
+            self._lib = None
+
+    def readinto(self) -> int:
+        """Block until the buffer is refilled; returns the number of bytes read."""
+        if self._lib is None:
+            data = self.pa.read(self._n)
+            self.buf[:len(data)] = data
+            return len(data)
+        if self._lib.pa_simple_read(self._handle, self._cbuf, self._n, ctypes.byref(self._err)) != 0:
+            raise pasimple.PaSimpleError(f'Could not record audio, error code: {self._err.value}')
+        return self._n
@@ -0,0 +1,184 @@
+# audio/ring.py
+import socket
+import threading
+from array import array
+
+_TOMBSTONE = object()
+
+class SpscRing:
+    """
+    Lock-free single-producer/single-consumer ring of object references.
+
+    The producer only ever advances `_tail` and the consumer only `_head`;
+    under the GIL a list-slot store and an int rebind are atomic, so neither
+    side takes a lock. `ready` is set on every push for the consumer to wait on.
+    """
+    def __init__(self, size: int = 256):
+        if size & (size - 1):
+            raise ValueError("ring size must be a power of 2")
+        self._slots = [None] * size
+        self._mask = size - 1
+        self._head = 0
+        self._tail = 0
+        self.ready = threading.Event()
+
+    def __len__(self) -> int:
+        return self._tail - self._head
+
+    def push(self, item) -> bool:
+        """Producer side. Returns False if the ring is full."""
+        tail = self._tail
+        if tail - self._head > self._mask:
+            return False
+        self._slots[tail & self._mask] = item
+        self._tail = tail + 1
+        self.ready.set()
+        return True
+
+    def pop(self):
+        """Consumer side. Returns the oldest live item, or None when empty."""
+        while self._head != self._tail:
+            idx = self._head & self._mask
+            item = self._slots[idx]
+            self._slots[idx] = None
+            self._head += 1
+            if item is not _TOMBSTONE:
+                return item
+        return None
+
+    def remove(self, match) -> None:
+        """Producer side. Tombstone pending items for which match(item) is true."""
+        for i in range(self._head, self._tail):
+            idx = i & self._mask
+            item = self._slots[idx]
+            if item is not None and item is not _TOMBSTONE and match(item):
+                self._slots[idx] = _TOMBSTONE
+
+    def snapshot(self) -> list:
+        """Pending items, oldest first (best effort while the consumer runs)."""
+        items = [self._slots[i & self._mask] for i in range(self._head, self._tail)]
+        return [item for item in items if item is not None and item is not _TOMBSTONE]
+
+
+class FrameRing:
+    """
+    Preallocated single-producer/single-consumer ring of fixed-size PCM frames,
+    each with a one-byte VAD flag.
+
+    The capture thread copies a frame into its slot and publishes it by
+    advancing `_tail`; the consumer reads the slot in place with peek() and
+    releases it with advance(). Wakeups go through a socketpair, one byte per
+    undrained batch, so an asyncio consumer can await them with sock_recv().
+
+    Every frame offered to push() gets the next sequence number, including the
+    ones dropped because the consumer fell behind, so gaps are visible to it.
+    """
+    def __init__(self, slots: int, frame_bytes: int):
+        if slots & (slots - 1):
+            raise ValueError("ring size must be a power of 2")
+        self.frame_bytes = frame_bytes
+        self._buf = bytearray(slots * frame_bytes)
+        self._view = memoryview(self._buf)
+        self._speech = bytearray(slots)
+        self._seq = array('Q', bytes(8 * slots))
+        self.produced = 0
+        self.dropped = 0
+        self._mask = slots - 1
+        self._head = 0
+        self._tail = 0
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._wake_pending = False
+
+    def __len__(self) -> int:
+        return self._tail - self._head
+
+    def push(self, frame, is_speech: bool) -> bool:
+        """Producer side. Returns False (frame dropped) if the ring is full."""
+        seq = self.produced
+        self.produced = seq + 1
+        tail = self._tail
+        if tail - self._head > self._mask:
+            self.dropped += 1
+            return False
+        idx = tail & self._mask
+        off = idx * self.frame_bytes
+        self._view[off:off + self.frame_bytes] = frame
+        self._speech[idx] = is_speech
+        self._seq[idx] = seq
+        self._tail = tail + 1
+        return True
+
+    def notify(self):
+        """Producer side. Wake the consumer unless a wakeup is already in flight."""
+        if not self._wake_pending:
+            self._wake_pending = True
+            try:
+                self._wake_w.send(b'\0')
+            except (BlockingIOError, OSError):
+                pass
+
+    async def wait(self, loop):
+        """Consumer side. Return once at least one frame may be ready."""
+        self._wake_pending = False
+        if self._head == self._tail:
+            await loop.sock_recv(self._wake_r, 64)
+
+    def peek(self):
+        """Consumer side. (frame view, is_speech, seq) of the oldest frame, or
+        None. The view stays valid until advance()."""
+        if self._head == self._tail:
+            return None
+        idx = self._head & self._mask
+        off = idx * self.frame_bytes
+        return self._view[off:off + self.frame_bytes], bool(self._speech[idx]), self._seq[idx]
+
+    def advance(self):
+        """Consumer side. Release the frame returned by peek()."""
+        self._head += 1
+
+    def clear(self):
+        """Consumer side. Drop every pending frame."""
+        self._head = self._tail
+
+
+class PrerollRing:
+    """
+    Fixed-size history of the most recent PCM frames, overwriting the oldest.
+
+    Single-threaded: the capture thread keeps the frames just before speech
+    onset here and copies them out in order once an utterance starts. Frames
+    are copied into preallocated storage, so callers may reuse their buffer.
+    """
+    def __init__(self, slots: int, frame_bytes: int):
+        self.frame_bytes = frame_bytes
+        self._slots = slots
+        self._view = memoryview(bytearray(slots * frame_bytes))
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, frame):
+        off = self._next * self.frame_bytes
+        self._view[off:off + self.frame_bytes] = frame
+        self._next = (self._next + 1) % self._slots
+        self._count = min(self._count + 1, self._slots)
+
+    def drain_into(self, dst, pos: int) -> int:
+        """Copy the held frames, oldest first, into dst at pos; empties the ring
+        and returns the new write position."""
+        fb = self.frame_bytes
+        idx = (self._next - self._count) % self._slots
+        for _ in range(self._count):
+            off = idx * fb
+            dst[pos:pos + fb] = self._view[off:off + fb]
+            pos += fb
+            idx = (idx + 1) % self._slots
+        self._count = 0
+        return pos
+
+    def clear(self):
+        self._count = 0
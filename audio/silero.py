@@ -0,0 +1,61 @@
+# audio/silero.py
+import numpy as np
+
+class SileroVad:
+    """
+    Optional neural VAD: Silero v5 ONNX, run on whole capture chunks.
+
+    Each chunk's int16 PCM is converted to float32 in one step and then fed to
+    the model in 512-sample windows. The recurrent state and the 64-sample
+    context carry over between windows, the same way Silero's own wrapper does
+    it. The windows can't share one batched run because the model is
+    recurrent over time; batching only helps for independent streams. Each VAD
+    frame takes the probability of the latest window that ends inside it.
+    """
+    WINDOW = 512   # samples per model call at 16 kHz
+    CONTEXT = 64
+
+    def __init__(self, model_path: str, sample_rate: int = 16000, threshold: float = 0.5):
+        import onnxruntime  # optional dependency, only needed for this backend
+        if sample_rate != 16000:
+            raise ValueError("Silero backend expects 16 kHz mono audio")
+        opts = onnxruntime.SessionOptions()
+        opts.intra_op_num_threads = 1
+        opts.inter_op_num_threads = 1
+        self._session = onnxruntime.InferenceSession(
+            model_path, sess_options=opts, providers=['CPUExecutionProvider'])
+        self._sr = np.array(sample_rate, dtype=np.int64)
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        self._state = np.zeros((2, 1, 128), dtype=np.float32)
+        self._tail = np.zeros(self.CONTEXT, dtype=np.float32)  # context + unprocessed samples
+        self._prob = 0.0
+
+    def speech_flags(self, pcm, frame_samples: int) -> list:
+        """One speech flag per complete frame of `frame_samples` in `pcm`."""
+        x = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) * (1 / 32768)
+        buf = np.concatenate((self._tail, x))
+        base = len(self._tail)  # index of x[0] in buf
+        span = self.CONTEXT + self.WINDOW
+        ends, probs = [], []
+        start = 0
+        while start + span <= len(buf):
+            out, self._state = self._session.run(
+                None, {'input': buf[None, start:start + span], 'state': self._state, 'sr': self._sr})
+            ends.append(start + span - base)
+            probs.append(float(out[0, 0]))
+            start += self.WINDOW
+        self._tail = buf[start:].copy()
+
+        flags = []
+        prob, j = self._prob, 0
+        for end in range(frame_samples, len(x) + 1, frame_samples):
+            while j < len(ends) and ends[j] <= end:
+                prob = probs[j]
+                j += 1
+            flags.append(prob >= self.threshold)
+        if probs:
+            self._prob = probs[-1]
+        return flags
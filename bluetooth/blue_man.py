@@ -16,6 +16,11 @@ class BluetoothManager:
         self.devices = {}
         self.last_scan = None
         self.scan_ttl = timedelta(seconds=scan_ttl_seconds)
+        # BlueZ serves the same Device1 introspection XML for every device path,
+        # so it is fetched once and proxies are built from it per path.
+        self._device_xml = None
+        self._device_objs = {}
+        self._obj_manager = None
 
     async def connect_bus(self):
         if self.bus is None:
@@ -35,10 +40,11 @@ class BluetoothManager:
             print(f'❌ Discovery error: {e}')
             return
         # Retrieve devices
-        xml = await self.bus.introspect(BLUEZ_SERVICE, '/')
-        mgr_obj = self.bus.get_proxy_object(BLUEZ_SERVICE, '/', xml)
-        mgr = mgr_obj.get_interface('org.freedesktop.DBus.ObjectManager')
-        objs = await mgr.call_get_managed_objects()
+        if self._obj_manager is None:
+            xml = await self.bus.introspect(BLUEZ_SERVICE, '/')
+            mgr_obj = self.bus.get_proxy_object(BLUEZ_SERVICE, '/', xml)
+            self._obj_manager = mgr_obj.get_interface('org.freedesktop.DBus.ObjectManager')
+        objs = await self._obj_manager.call_get_managed_objects()
         # Rebuild cache
         self.devices.clear()
         for path, interfaces in objs.items():
@@ -58,6 +64,16 @@ class BluetoothManager:
                 }
         self.last_scan = datetime.now()
 
+    async def _device_obj(self, path):
+        """Proxy object for a device path, introspecting at most once overall."""
+        obj = self._device_objs.get(path)
+        if obj is None:
+            if self._device_xml is None:
+                self._device_xml = await self.bus.introspect(BLUEZ_SERVICE, path)
+            obj = self.bus.get_proxy_object(BLUEZ_SERVICE, path, self._device_xml)
+            self._device_objs[path] = obj
+        return obj
+
     async def list_devices(self, online_only=False):
         """
         List cached devices. If cache expired or empty, perform a scan.
@@ -84,58 +100,64 @@ class BluetoothManager:
         return result
 
     async def connect(self, names):
-        """Pair, trust, and connect to named devices."""
+        """Pair, trust, and connect to named devices (all devices in parallel)."""
         await self.connect_bus()
         # Refresh cache if stale
         if self.last_scan is None or datetime.now() - self.last_scan > self.scan_ttl:
             await self.scan()
-        for name in names:
-            info = self.devices.get(name)
-            if not info:
-                print(f'⚠️ Device "{name}" not found')
-                continue
-            path = info['path']
-            xml = await self.bus.introspect(BLUEZ_SERVICE, path)
-            dev_obj = self.bus.get_proxy_object(BLUEZ_SERVICE, path, xml)
-            dev = dev_obj.get_interface('org.bluez.Device1')
-            props = dev_obj.get_interface('org.freedesktop.DBus.Properties')
-            try:
-                print(f'🔗 Pairing {name}...')
-                await dev.call_pair()
-                print(f'✅ Paired {name}')
-            except DBusError:
-                print(f'⚠️ Pair skipped for {name}')
-            try:
-                print(f'🤝 Trusting {name}...')
-                await props.call_set('org.bluez.Device1', 'Trusted', Variant('b', True))
-                print(f'✅ Trusted {name}')
-            except DBusError as e:
-                print(f'❌ Trust failed for {name}: {e}')
-            try:
-                print(f'🔌 Connecting {name}...')
-                await dev.call_connect()
-                print(f'✅ Connected {name}')
-            except DBusError as e:
-                print(f'❌ Connect failed for {name}: {e}')
+        results = await asyncio.gather(*(self._connect_one(name) for name in names), return_exceptions=True)
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                print(f'❌ Connect failed for {name}: {result}')
+
+    async def _connect_one(self, name):
+        info = self.devices.get(name)
+        if not info:
+            print(f'⚠️ Device "{name}" not found')
+            return
+        dev_obj = await self._device_obj(info['path'])
+        dev = dev_obj.get_interface('org.bluez.Device1')
+        props = dev_obj.get_interface('org.freedesktop.DBus.Properties')
+        try:
+            print(f'🔗 Pairing {name}...')
+            await dev.call_pair()
+            print(f'✅ Paired {name}')
+        except DBusError:
+            print(f'⚠️ Pair skipped for {name}')
+        try:
+            print(f'🤝 Trusting {name}...')
+            await props.call_set('org.bluez.Device1', 'Trusted', Variant('b', True))
+            print(f'✅ Trusted {name}')
+        except DBusError as e:
+            print(f'❌ Trust failed for {name}: {e}')
+        try:
+            print(f'🔌 Connecting {name}...')
+            await dev.call_connect()
+            print(f'✅ Connected {name}')
+        except DBusError as e:
+            print(f'❌ Connect failed for {name}: {e}')
 
     async def disconnect(self, names):
-        """Disconnect named devices."""
+        """Disconnect named devices (all devices in parallel)."""
         await self.connect_bus()
-        for name in names:
-            info = self.devices.get(name)
-            if not info:
-                print(f'⚠️ Device "{name}" not found')
-                continue
-            path = info['path']
-            xml = await self.bus.introspect(BLUEZ_SERVICE, path)
-            dev_obj = self.bus.get_proxy_object(BLUEZ_SERVICE, path, xml)
-            dev = dev_obj.get_interface('org.bluez.Device1')
-            try:
-                print(f'⏏️ Disconnecting {name}...')
-                await dev.call_disconnect()
-                print(f'✅ Disconnected {name}')
-            except DBusError as e:
-                print(f'❌ Disconnect failed for {name}: {e}')
+        results = await asyncio.gather(*(self._disconnect_one(name) for name in names), return_exceptions=True)
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                print(f'❌ Disconnect failed for {name}: {result}')
+
+    async def _disconnect_one(self, name):
+        info = self.devices.get(name)
+        if not info:
+            print(f'⚠️ Device "{name}" not found')
+            return
+        dev_obj = await self._device_obj(info['path'])
+        dev = dev_obj.get_interface('org.bluez.Device1')
+        try:
+            print(f'⏏️ Disconnecting {name}...')
+            await dev.call_disconnect()
+            print(f'✅ Disconnected {name}')
+        except DBusError as e:
+            print(f'❌ Disconnect failed for {name}: {e}')
 
 # Example usage
 async def main():
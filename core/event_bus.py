@@ -1,6 +1,5 @@
 # core/event_bus.py
-from collections import defaultdict
-from typing import Type, Callable, Dict, List, Any
+from typing import Type, Callable, Dict, Tuple, Any
 import asyncio
 
 class Event:
@@ -9,16 +8,27 @@ class Event:
 
 class EventBus:
     def __init__(self):
-        self._subs: Dict[Type[Event], List[Callable[[Event], Any]]] = defaultdict(list)
+        # Handlers are split by kind at subscribe time and stored as tuples, so
+        # emit is a plain dict lookup plus a tight loop per bucket.
+        self._sync: Dict[Type[Event], Tuple[Callable[[Event], Any], ...]] = {}
+        self._async: Dict[Type[Event], Tuple[Callable[[Event], Any], ...]] = {}
 
     def subscribe(self, event_type: Type[Event], handler: Callable[[Event], Any]):
         """Register a handler for a specific event type."""
-        self._subs[event_type].append(handler)
+        bucket = self._async if asyncio.iscoroutinefunction(handler) else self._sync
+        bucket[event_type] = bucket.get(event_type, ()) + (handler,)
 
     def emit(self, event: Event):
-        """Publish an event to all subscribers (sync or async)."""
-        for handler in self._subs[type(event)]:
-            result = handler(event)
-            # If handler returns a coroutine, schedule it
-            if asyncio.iscoroutine(result):
-                asyncio.create_task(result)
+        """
+        Publish an event to all subscribers (sync or async). Plain handlers
+        run first, in subscription order, then coroutine functions are
+        scheduled. A plain handler that returns a coroutine (a lambda, an
+        async __call__, a wrapper) gets it scheduled too.
+        """
+        t = type(event)
+        for handler in self._sync.get(t, ()):
+            r = handler(event)
+            if asyncio.iscoroutine(r):
+                asyncio.create_task(r)
+        for handler in self._async.get(t, ()):
+            asyncio.create_task(handler(event))
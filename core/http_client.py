@@ -0,0 +1,107 @@
+# core/http_client.py
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (httpx's optional HTTP/2 backend)
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+# JSON bodies: orjson when installed, stdlib json otherwise
+try:
+    import orjson
+
+    json_dumps = orjson.dumps
+    json_loads = orjson.loads
+except ImportError:
+    import json
+
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+    json_loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+# transient failures worth another attempt; HTTP status errors are not retried
+RETRYABLE = (httpx.ConnectError, httpx.ReadTimeout, httpx.RemoteProtocolError)
+
+_client: Optional[httpx.AsyncClient] = None
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Process-wide pooled AsyncClient, created on first use.
+
+    Every cloud call shares its keep-alive connections, so only the first
+    request to a host pays the TCP/TLS handshake. With h2 installed, requests
+    to the same host are multiplexed as HTTP/2 streams over one connection.
+    Callers pass their own per-request `timeout=`.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0),
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50,
+                                keepalive_expiry=60),
+            http2=_HTTP2,
+        )
+    return _client
+
+async def warm_up(urls) -> None:
+    """
+    Open a pooled connection to each distinct origin in `urls` ahead of the
+    first real request, so it doesn't pay the handshake. Best effort: any
+    HTTP response, even a 404, leaves the connection in the pool.
+    """
+    origins = {str(httpx.URL(u).copy_with(path="/", query=None, fragment=None))
+               for u in urls if u}
+    client = get_client()
+
+    async def touch(origin):
+        try:
+            await client.head(origin, timeout=2.0)
+        except httpx.HTTPError as e:
+            logger.debug("Warm-up of %s failed: %s", origin, e)
+
+    await asyncio.gather(*(touch(o) for o in origins))
+
+async def aclose() -> None:
+    """Close the shared client; call once on shutdown from the owning loop."""
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+@lru_cache(maxsize=None)
+def backoff_schedule(max_retries: int, backoff_factor: float) -> Tuple[float, ...]:
+    """Sleeps between attempts: backoff_factor, doubling, max_retries - 1 of them."""
+    return tuple(backoff_factor * 2 ** i for i in range(max_retries - 1))
+
+async def post_with_retries(url: str, delays: Tuple[float, ...], **kwargs) -> httpx.Response:
+    """
+    POST through the shared client, retrying network errors and read
+    timeouts after each delay in `delays` (see backoff_schedule). HTTP
+    status errors raise at once: a 4xx/5xx won't succeed on retry.
+    """
+    attempts = len(delays) + 1
+    for attempt in range(1, attempts + 1):
+        try:
+            resp = await get_client().post(url, **kwargs)
+            resp.raise_for_status()
+            return resp
+        except RETRYABLE as e:
+            logger.warning("Request to %s failed (attempt %d/%d): %s",
+                           url, attempt, attempts, e)
+            if attempt == attempts:
+                logger.error("Max retries reached for %s", url)
+                raise
+            await asyncio.sleep(delays[attempt - 1])
+        except httpx.HTTPStatusError as e:
+            logger.error("Server returned HTTP %d for %s: %s",
+                         e.response.status_code, url, e)
+            raise
@@ -0,0 +1,32 @@
+# core/result_cache.py
+import hashlib
+from collections import OrderedDict
+from typing import Any, Hashable
+
+class ResultCache:
+    """
+    LRU of cloud-call results keyed by the uploaded content, so the same
+    audio or JPEG bytes sent twice get the first answer back without a
+    round trip. Only successful results should be put; event-loop use only.
+    """
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def digest(data: bytes) -> bytes:
+        # BLAKE2b: several times faster than SHA-256, and 128 bits is plenty
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            return default
+        return self._entries[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
@@ -1,4 +1,5 @@
 import wave
+import numpy as np
 import pasimple
 import webrtcvad
 
@@ -22,21 +23,17 @@ with pasimple.PaSimple(pasimple.PA_STREAM_RECORD, FORMAT, CHANNELS, SAMPLE_RATE)
     audio_data  = pa.read(total_bytes)
 print("Recording stopped")
 # ── Split into 30 ms frames and detect speech ─────────────────────────────
-i = 0
-speech_frames = []
-for offset in range(0, len(audio_data), FRAME_BYTES):
-    print(i, ":", end="\t")
-    frame = audio_data[offset:offset + FRAME_BYTES]
-    if len(frame) < FRAME_BYTES:
-        break
-    if vad.is_speech(frame, SAMPLE_RATE):
-        print("true")
-        speech_frames.append(frame)
-    else:
-        print("false")
+# zero-copy (n_frames, samples_per_frame) view; a trailing partial frame is dropped
+n_frames = len(audio_data) // FRAME_BYTES
+frames = np.frombuffer(audio_data, dtype=np.int16, count=n_frames * FRAME_BYTES // 2)
+frames = frames.reshape(n_frames, -1)
+speech_mask = np.zeros(n_frames, dtype=np.bool_)
+for i in range(n_frames):
+    speech_mask[i] = vad.is_speech(frames[i].tobytes(), SAMPLE_RATE)
+print(f"{int(speech_mask.sum())}/{n_frames} frames flagged as speech")
 
 # ── Combine only the speech segments ──────────────────────────────────────
-combined = b''.join(speech_frames)
+combined = frames[speech_mask].tobytes()
 
 # ── Save to WAV ───────────────────────────────────────────────────────────
 with wave.open('recording_speech.wav', 'wb') as wf:
@@ -45,4 +42,4 @@ with wave.open('recording_speech.wav', 'wb') as wf:
     wf.setframerate(SAMPLE_RATE)
     wf.writeframes(combined)
 
-print(f"Saved {len(speech_frames)} frames of speech → recording_speech.wav")
+print(f"Saved {int(speech_mask.sum())} frames of speech → recording_speech.wav")
@@ -1,15 +1,17 @@
-import json
-
-class Config:
-    _config = None
-    
-    @classmethod
-    def get_config(cls):
-        if cls._config is None:
-            cls.reload_config()
-        return cls._config
-    
-    @classmethod
-    def reload_config(cls):
-        with open("settings.json", "r") as f:
-            cls._config = json.load(f)
\ No newline at end of file
+from functools import cache
+from pathlib import Path
+
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+
+@cache
+def get_config():
+    # one read() of the raw bytes; the parser handles decoding
+    return _json.loads(Path("settings.json").read_bytes())
+
+def reload():
+    get_config.cache_clear()
+    return get_config()
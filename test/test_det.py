@@ -2,13 +2,14 @@ import os
 import httpx
 import asyncio
 import logging
+from collections import Counter
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-from config import Config
+from config import get_config
 
-config = Config.get_config()
+config = get_config()
 
 class Template:
     pass
@@ -17,21 +18,19 @@ self = Template()
 
 self.backoff_factor, self.http_timeout, self.max_retries = 1., 10, 3
 
-def list_to_freq_dict(lst):
-    freq_dict = {}
-    for item in lst:
-        freq_dict[item] = freq_dict.get(item, 0) + 1
-    return freq_dict
-
+# One pooled client for every call and retry, so repeat POSTs reuse the connection
+_client = httpx.AsyncClient(
+    timeout=self.http_timeout,
+    limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+)
 
 async def _post_with_retries(url: str, **kwargs) -> httpx.Response:
     delay = self.backoff_factor
     for attempt in range(1, self.max_retries + 1):
         try:
-            async with httpx.AsyncClient(timeout=self.http_timeout) as client:
-                resp = await client.post(url, **kwargs)
-                resp.raise_for_status()
-                return resp
+            resp = await _client.post(url, **kwargs)
+            resp.raise_for_status()
+            return resp
         except (httpx.ConnectError, httpx.ReadTimeout, httpx.RemoteProtocolError) as e:
             logger.warning("HTTP request failed (attempt %d/%d) to %s: %s",
                            attempt, self.max_retries, url, e)
@@ -55,14 +54,16 @@ async def detect_objects(image_path: str) -> str:
         detections = [ {"class_name": "person"}, {"class_name": "car"} ]
     else:
         try:
+            # read once: a file object would already be at EOF on a retry
             with open(image_path, "rb") as f:
-                files = {"file": (filename, f, "application/octet-stream")}
-                resp = await _post_with_retries(url, files=files)
+                data = f.read()
+            files = {"file": (filename, data, "application/octet-stream")}
+            resp = await _post_with_retries(url, files=files)
             detections = resp.json().get("detections", [])
         except Exception as e:
             logger.error("Detection failed: %s", e, exc_info=True)
             return "Detection error"
-    occurences = list_to_freq_dict([obj.get("class_name", "") for obj in detections])
+    occurences = Counter(obj.get("class_name", "") for obj in detections)
     return ", ".join(f"{v} {k}{'s' if v>1 else ''}" for k, v in occurences.items())
 
 
@@ -78,5 +79,11 @@ async def test(N=3):
     print("AVG", sum(times)/len(times))
     print(times)
 
+async def main():
+    try:
+        await test(10)
+    finally:
+        await _client.aclose()
+
 if __name__ == "__main__":
-    asyncio.run(test(10))
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
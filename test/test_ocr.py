@@ -1,4 +1,6 @@
 import os
+import time
+from pathlib import Path
 import httpx
 import asyncio
 import logging
@@ -6,9 +8,15 @@ import logging
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-from config import Config
+from config import get_config
 
-config = Config.get_config()
+config = get_config()
+
+# One pooled client for every call and retry, so repeat POSTs reuse the connection
+_client = httpx.AsyncClient(
+    timeout=10.0,
+    limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+)
 
 # OCR helper function
 async def ocr_image(
@@ -16,24 +24,27 @@ async def ocr_image(
     url: str = "http://127.0.0.1:8866/ocr/",
     timeout: float = 10.0,
     max_retries: int = 3,
-    backoff_factor: float = 1.0
+    backoff_factor: float = 1.0,
+    client: httpx.AsyncClient = None,
 ) -> dict:
     """
     Send an image to the OCR service and return the JSON response.
     Implements manual retry/back-off on network errors.
+    Uses the module's pooled client unless one is passed in.
     """
+    client = client or _client
     filename = os.path.basename(image_path)
     headers = {"accept": "application/json"}
     delay = backoff_factor
+    # read once, off the event loop; the bytes are reused by every retry
+    data = await asyncio.to_thread(Path(image_path).read_bytes)
+    files = {"image": (filename, data, "image/png")}
 
     for attempt in range(1, max_retries + 1):
         try:
-            with open(image_path, "rb") as f:
-                files = {"image": (filename, f, "image/png")}
-                async with httpx.AsyncClient(timeout=timeout) as client:
-                    resp = await client.post(url, headers=headers, files=files)
-                    resp.raise_for_status()
-                    return resp.json()
+            resp = await client.post(url, headers=headers, files=files, timeout=timeout)
+            resp.raise_for_status()
+            return resp.json()
         except (httpx.ConnectError, httpx.ReadTimeout, httpx.RemoteProtocolError) as e:
             logger.warning(
                 "OCR request failed (attempt %d/%d) to %s: %s",
@@ -51,31 +62,55 @@ async def ocr_image(
             )
             return {}
 
-async def detect_text(frame_path: str) -> str:
+OCR_URL = config["host"]["url"].rstrip("/") + config["ocr"]["endpoint"]
+
+async def detect_text(frame_path: str, client: httpx.AsyncClient = None) -> str:
     NO_TEXT_OR_FAILED = ""
     # Placeholder: implement OCR-based detection
-    url = config["host"]["url"].rstrip("/") + config["ocr"]["endpoint"]
-    print("url:", url)
-    #return
-    response = await ocr_image(frame_path, url)
+    response = await ocr_image(frame_path, OCR_URL, client=client)
 
     text = response.get("text", NO_TEXT_OR_FAILED)
     return text
 
-async def test(N=3):
-    import time
-    times = list()
-    for i in range(N):
-        im_path = "test\ocr_test.png"
-        start = time.time()
-        text = await detect_text(im_path)
-        times.append(time.time()-start)
+async def work_item(paths, sem, client):
+    """Put every page of one work item in flight at once; return per-page latencies."""
+    async def bounded(i, path):
+        async with sem:
+            start = time.perf_counter()
+            text = await detect_text(path, client)
+            elapsed = time.perf_counter() - start
         print(i, text)
         logger.info(f"[{i}] Captured text: {text}")
+        return elapsed
+    return await asyncio.gather(*(bounded(i, p) for i, p in enumerate(paths)))
+
+async def test(N=3, K=8, parallel=8):
+    """OCR N pages as work items of K pages each, one item after another."""
+    im_path = os.path.join("test", "ocr_test.png")
+    print("url:", OCR_URL)
+    sem = asyncio.Semaphore(parallel)
+    paths = [im_path] * N
+
+    times = []
+    start = time.perf_counter()
+    for k in range(0, N, K):
+        item_start = time.perf_counter()
+        times += await work_item(paths[k:k + K], sem, _client)
+        print(f"item {k // K}: {min(K, N - k)} pages in {time.perf_counter() - item_start:.3f}s")
+    wall = time.perf_counter() - start
+
+    times.sort()
+    print("P50", times[len(times) // 2])
+    print("P95", times[min(len(times) - 1, int(len(times) * 0.95))])
     print("AVG", sum(times)/len(times))
-    print(times)
-        
-        
+    print("WALL", wall)
+    print("PAGES/S", N / wall)
+
+async def main():
+    try:
+        await test(13)
+    finally:
+        await _client.aclose()
 
 if __name__ == "__main__":
-    asyncio.run(test(13))
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
@@ -1,12 +1,31 @@
+import time
 import requests
+from requests.adapters import HTTPAdapter
 
 url = 'http://10.0.0.18:5000/transcribe'  # Replace with your server's URL
-files = {'file': open('recording_speech.wav', 'rb')}  # Replace 'audio.wav' with your file path
+path = 'recording_speech.wav'  # Replace with your file path
+N = 5
 
-response = requests.post(url, files=files)
+# One keep-alive session: only the first request pays the TCP handshake
+session = requests.Session()
+session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=20))
 
-if response.status_code == 200:
-    transcript = response.json()['transcript']
-    print(transcript)
-else:
-    print(f"Error: {response.status_code}")
\ No newline at end of file
+def transcribe(path):
+    with open(path, 'rb') as f:
+        return session.post(url, files={'file': f})
+
+times = []
+for i in range(N):
+    start = time.perf_counter()
+    response = transcribe(path)
+    times.append(time.perf_counter() - start)
+
+    if response.status_code == 200:
+        transcript = response.json()['transcript']
+        print(i, transcript)
+    else:
+        print(f"Error: {response.status_code}")
+
+print("AVG", sum(times)/len(times))
+print(times)
+session.close()
@@ -4,8 +4,6 @@ import threading
 import logging
 from vision.camera_helpers import get_camera
 
-logging.basicConfig(level=logging.DEBUG)
-
 class Camera:
     _instance      = None
     _instance_lock = threading.Lock()
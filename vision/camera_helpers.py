@@ -1,15 +1,13 @@
+import os
 import cv2
 import logging
+from functools import lru_cache
 from config import Config
 
 # Function to get the camera object
 def get_camera(retries=3):
     try:
-        config = Config.get_config()
-        # Validate the configuration
-        validate_config(config)
-        # Log the loaded configuration
-        logging.info("Loaded configuration: %s", config)
+        config = _validated_config()
         # Check if the camera is enabled in the config
         if config.get('camera', {}).get('enabled', False):
             # Get the camera URL from the config
@@ -21,7 +19,7 @@ def get_camera(retries=3):
             for attempt in range(retries):
                 logging.info(f"Attempting to connect to camera (attempt {attempt + 1})...")
                 # Attempt to open the camera
-                camera = cv2.VideoCapture(camera_url)
+                camera = open_capture(camera_url, config['camera'])
                 if camera.isOpened():
                     logging.info("Camera opened successfully.")
                     return camera
@@ -42,6 +40,37 @@ def get_camera(retries=3):
         logging.error(f"Unexpected error: {e}")
         raise RuntimeError(f"Unexpected error: {e}")
 
+# Validate and log the configuration once; reconnects reuse the result.
+# Call _validated_config.cache_clear() after Config.reload_config().
+@lru_cache(maxsize=1)
+def _validated_config():
+    config = Config.get_config()
+    # Validate the configuration
+    validate_config(config)
+    # Log the loaded configuration
+    logging.info("Loaded configuration: %s", config)
+    return config
+
+# Open a capture with low-latency hints; backends ignore properties they don't support
+def open_capture(camera_url, camera_config):
+    if isinstance(camera_url, str) and camera_url.startswith("rtsp://"):
+        # interleaved TCP: no UDP packet loss smearing frames, no reorder buffering
+        os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS", "rtsp_transport;tcp")
+    local = isinstance(camera_url, int) or str(camera_url).startswith("/dev/video")
+    camera = cv2.VideoCapture(camera_url) if local else cv2.VideoCapture(camera_url, cv2.CAP_FFMPEG)
+    # keep at most one decoded frame queued, so read() returns the newest one
+    camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    if local:
+        # USB cameras: have the camera send MJPEG rather than raw YUV
+        camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+    # optional camera.width / camera.height / camera.fps in settings.json
+    for prop, key in ((cv2.CAP_PROP_FRAME_WIDTH, 'width'),
+                      (cv2.CAP_PROP_FRAME_HEIGHT, 'height'),
+                      (cv2.CAP_PROP_FPS, 'fps')):
+        if camera_config.get(key):
+            camera.set(prop, camera_config[key])
+    return camera
+
 def validate_config(config):
     if 'camera' not in config:
         raise RuntimeError("Missing 'camera' section in configuration.")
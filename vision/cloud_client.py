@@ -1,43 +1,132 @@
 # vision/cloud_client.py
 
+import asyncio
+import contextlib
+import json
 import aiohttp, cv2
 from typing import List
 
+# task name -> (single-task endpoint, response field)
+TASK_ENDPOINTS = {
+    'ocr':     ('ocr', 'text'),
+    'objects': ('detect_objects', 'objects'),
+    'caption': ('caption', 'caption'),
+}
+
 class CloudVisionClient:
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, limiter=None):
+        """
+        :param limiter: optional factory of an async context manager entered
+                        around every POST, e.g. a rate/concurrency limit
+        """
         self.base_url = base_url.rstrip('/')
-        self.session = aiohttp.ClientSession()
+        self._limiter = limiter
+        # created on first request, inside the running loop
+        self.session = None
+        # None until the first analyze(); False once the server lacks /analyze
+        self._has_analyze = None
+
+    async def _ensure_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=20, limit_per_host=20, keepalive_timeout=60,
+                                             enable_cleanup_closed=True)
+            self.session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=30))
+        return self.session
+
+    def _limit(self):
+        return self._limiter() if self._limiter is not None else contextlib.nullcontext()
 
     async def close(self):
-        await self.session.close()
+        session, self.session = self.session, None
+        if session is not None:
+            await session.close()
 
-    async def _post_image(self, path: str) -> dict:
+    async def _post_image(self, path: str, data: bytes) -> dict:
         """Helper to POST a JPEG frame to /<path> endpoint."""
-        return await self._post_bytes(f'{self.base_url}/{path}')
+        return await self._post_bytes(f'{self.base_url}/{path}', data)
 
-    async def _post_bytes(self, url: str) -> dict:
+    async def _post_bytes(self, url: str, data: bytes) -> dict:
         headers = {'Content-Type': 'application/octet-stream'}
-        # assume caller has JPEG‐encoded bytes ready
-        async with self.session.post(url, data=self._last_img_bytes, headers=headers) as resp:
+        session = await self._ensure_session()
+        async with self._limit(), session.post(url, data=data, headers=headers) as resp:
+            resp.raise_for_status()
+            return await resp.json()
+
+    @staticmethod
+    def _encode(frame) -> bytes:
+        # stateless, so concurrent calls can't swap each other's bodies;
+        # quality 80 (default 95) roughly halves the upload at no visible cost
+        _, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        return buf.tobytes()
+
+    @staticmethod
+    def _result(task: str, data: dict):
+        value = data.get(TASK_ENDPOINTS[task][1])
+        if task == 'objects':
+            return value or []
+        return (value or '').strip()
+
+    async def _post_analyze(self, data: bytes, tasks: List[str]) -> dict:
+        form = aiohttp.FormData()
+        form.add_field('image', data, filename='frame.jpg', content_type='image/jpeg')
+        form.add_field('tasks', json.dumps(tasks), content_type='application/json')
+        session = await self._ensure_session()
+        async with self._limit(), session.post(f'{self.base_url}/analyze', data=form) as resp:
             resp.raise_for_status()
             return await resp.json()
 
-    async def _encode(self, frame) -> bytes:
-        _, buf = cv2.imencode('.jpg', frame)
-        self._last_img_bytes = buf.tobytes()
-        return self._last_img_bytes
+    async def _post_task(self, task: str, data: bytes):
+        try:
+            return task, self._result(task, await self._post_image(TASK_ENDPOINTS[task][0], data))
+        except Exception as e:
+            return task, e
+
+    async def analyze(self, frame, tasks: List[str], on_result=None) -> dict:
+        """
+        Run several tasks ('ocr', 'objects', 'caption') on one frame with a
+        single JPEG encode. Uses the server's /analyze endpoint, one upload,
+        when it has one; otherwise posts the same bytes to each task's own
+        endpoint concurrently. Returns {task: result}, with the exception in
+        place of the result for a task whose endpoint failed.
+
+        on_result(task, result) is called as each result arrives, so a fast
+        task isn't held back behind a slow one.
+        """
+        data = await asyncio.to_thread(self._encode, frame)
+        results = {}
+        if self._has_analyze is not False:
+            try:
+                out = await self._post_analyze(data, tasks)
+                self._has_analyze = True
+            except aiohttp.ClientResponseError as e:
+                if e.status not in (404, 405) or self._has_analyze:
+                    raise
+                self._has_analyze = False  # older server: per-task endpoints from now on
+            else:
+                for t in tasks:
+                    results[t] = self._result(t, {TASK_ENDPOINTS[t][1]: out.get(t)})
+                    if on_result is not None:
+                        on_result(t, results[t])
+                return results
+        for fut in asyncio.as_completed([self._post_task(t, data) for t in tasks]):
+            t, res = await fut
+            results[t] = res
+            if on_result is not None:
+                on_result(t, res)
+        return results
 
     async def detect_objects(self, frame) -> List[str]:
-        await self._encode(frame)
-        data = await self._post_bytes(f'{self.base_url}/detect_objects')
+        data = await asyncio.to_thread(self._encode, frame)
+        data = await self._post_image('detect_objects', data)
         return data.get('objects', [])
 
     async def ocr(self, frame) -> str:
-        await self._encode(frame)
-        data = await self._post_bytes(f'{self.base_url}/ocr')
+        data = await asyncio.to_thread(self._encode, frame)
+        data = await self._post_image('ocr', data)
         return data.get('text', '').strip()
 
     async def caption(self, frame) -> str:
-        await self._encode(frame)
-        data = await self._post_bytes(f'{self.base_url}/caption')
+        data = await asyncio.to_thread(self._encode, frame)
+        data = await self._post_image('caption', data)
         return data.get('caption', '').strip()
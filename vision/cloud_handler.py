@@ -1,10 +1,15 @@
 # vision/cloud_handler.py
 
 import asyncio
+import contextlib
 import logging
 import time
 from typing import Optional
 
+import aiohttp
+import cv2
+import numpy as np
+
 from core.event_bus import EventBus
 from events.events import (
     InterestingFrame,      # from vision_module
@@ -15,6 +20,15 @@ from vision.cloud_client import CloudVisionClient
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# InterestingFrame type -> the cloud task it triggers
+_TASK_FOR_TYPE = {'text': 'ocr', 'object': 'objects', 'scene': 'caption'}
+# cloud task -> (last-run attribute, interval attribute)
+_TASK_TIMING = {
+    'ocr':     ('_last_ocr', 'ocr_interval'),
+    'objects': ('_last_object', 'object_interval'),
+    'caption': ('_last_caption', 'caption_interval'),
+}
+
 class SmartCloudVisionHandler:
     def __init__(
         self,
@@ -23,6 +37,11 @@ class SmartCloudVisionHandler:
         caption_interval: float = 5.0,
         ocr_interval: float     = 2.0,
         object_interval: float  = 1.0,
+        max_inflight: int       = 2,
+        max_rps: float          = 2.0,
+        max_retries: int        = 3,
+        backoff_factor: float   = 0.5,
+        dedup_bits: int         = 6,
     ):
         """
         :param bus:             your central event bus
@@ -30,14 +49,32 @@ class SmartCloudVisionHandler:
         :param caption_interval: min seconds between caption calls
         :param ocr_interval:     min seconds between OCR calls
         :param object_interval:  min seconds between object-detection calls
+        :param max_inflight:     max cloud requests in flight at once
+        :param max_rps:          max cloud requests started per second
+        :param max_retries:      attempts per call on 429/503 or timeout
+        :param backoff_factor:   initial retry delay in seconds (doubles)
+        :param dedup_bits:       skip frames whose dHash differs from the last
+                                 upload of the same kind by fewer bits
         """
         self.bus              = bus
-        self.client           = CloudVisionClient(base_url)
+        # every POST the client makes, per-task or fused, is admitted by _request_slot
+        self.client           = CloudVisionClient(base_url, limiter=self._request_slot)
         self.caption_interval = caption_interval
         self.ocr_interval     = ocr_interval
         self.object_interval  = object_interval
+        self.max_retries      = max_retries
+        self.backoff_factor   = backoff_factor
+
+        # bursts of InterestingFrame events queue here instead of at the API
+        self._sema            = asyncio.Semaphore(max_inflight)
+        self._min_gap         = 1.0 / max_rps
+        self._next_slot       = 0.0
 
-        # last time we called each endpoint
+        # dHash of the last frame each endpoint accepted, to skip near-duplicates
+        self.dedup_bits       = dedup_bits
+        self._last_hash:      dict = {}
+
+        # last time we called each endpoint (time.monotonic())
         self._last_caption:   float = 0.0
         self._last_ocr:       float = 0.0
         self._last_object:    float = 0.0
@@ -50,15 +87,55 @@ class SmartCloudVisionHandler:
         # we only need a single subscription
         self.bus.subscribe(InterestingFrame, self._on_interesting_frame)
 
-    def stop(self):
-        """If you ever need to cleanup the client session."""
-        asyncio.create_task(self.client.close())
+    async def aclose(self):
+        """Close the client session; await it on shutdown from the owning loop."""
+        await self.client.close()
+
+    def _should_run(self, last_run: float, interval: float, now: float) -> bool:
+        return (now - last_run) >= interval
 
-    def _should_run(self, last_run: float, interval: float) -> bool:
-        return (time.time() - last_run) >= interval
+    @contextlib.asynccontextmanager
+    async def _request_slot(self):
+        """Admit one POST under the in-flight cap and the request-rate gap."""
+        loop = asyncio.get_running_loop()
+        # reserve a start slot before sleeping so concurrent callers space out
+        now = loop.time()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self._min_gap
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        async with self._sema:
+            yield
+
+    async def _call(self, fn, *args):
+        """
+        Run one cloud call, retrying 429/503 and timeouts with exponential
+        backoff. The client takes a _request_slot for each POST it makes.
+        """
+        delay = self.backoff_factor
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                return await fn(*args)
+            except aiohttp.ClientResponseError as e:
+                if e.status not in (429, 503) or attempt == self.max_retries:
+                    raise
+                retry_after = (e.headers or {}).get('Retry-After', '')
+                wait = float(retry_after) if retry_after.isdigit() else delay
+                logger.warning(f"Cloud returned {e.status}, retrying in {wait:.1f}s")
+            except asyncio.TimeoutError:
+                if attempt == self.max_retries:
+                    raise
+                wait = delay
+                logger.warning(f"Cloud call timed out, retrying in {wait:.1f}s")
+            await asyncio.sleep(wait)
+            delay *= 2
 
-    def _update_time(self, attr: str):
-        setattr(self, attr, time.time())
+    @staticmethod
+    def _dhash(frame) -> int:
+        """64-bit difference hash of a 9x8 grayscale thumbnail."""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+        return int.from_bytes(np.packbits(small[:, 1:] > small[:, :-1]).tobytes(), 'big')
 
     async def _on_interesting_frame(self, ev: InterestingFrame):
         """
@@ -66,46 +143,70 @@ class SmartCloudVisionHandler:
         metadata['type'] should be one of: 'text', 'object', 'scene'
         """
         mtype = ev.metadata.get('type')
+        task = _TASK_FOR_TYPE.get(mtype)
+        # one clock read covers every due check for this frame
+        now = time.monotonic()
+        if task is None or not self._due(task, now):
+            logger.debug(f"No cloud call for metadata type={mtype}")
+            return
 
-        # ── OCR path ─────────────────────────────────────────────
-        if mtype == 'text' and self._should_run(self._last_ocr, self.ocr_interval):
-            logger.debug("Triggering OCR on cloud")
-            try:
-                txt = await self.client.ocr(ev.frame)
-                if txt and txt != self._last_ocr_text:
-                    self._last_ocr_text = txt
-                    self._update_time('_last_ocr')
-                    self.bus.emit(OCRResult(text=txt))
-                    logger.info(f"OCRResult emitted: {txt!r}")
-            except Exception as e:
-                logger.warning(f"OCR error: {e}")
+        # the frame is encoded and uploaded once, so other due tasks ride along
+        tasks = [task] + [t for t in _TASK_FOR_TYPE.values() if t != task and self._due(t, now)]
+        h = await asyncio.to_thread(self._dhash, ev.frame)
+        fresh = []
+        for t in tasks:
+            last = self._last_hash.get(t)
+            if last is not None and (h ^ last).bit_count() < self.dedup_bits:
+                logger.debug(f"Skipping {t}: frame matches last upload")
+            else:
+                fresh.append(t)
+        if not fresh:
+            return
+        # the interval runs from each send, whatever comes back: an OCR that
+        # keeps finding nothing must not ride along on every other upload
+        for t in fresh:
+            setattr(self, _TASK_TIMING[t][0], now)
 
-        # ── Object Detection path ──────────────────────────────
-        elif mtype == 'object' and self._should_run(self._last_object, self.object_interval):
-            logger.debug("Triggering object detection on cloud")
+        def on_result(t, res):
+            # runs as each task's result arrives, so OCR isn't held behind a slow caption
+            if isinstance(res, Exception):
+                logger.warning(f"{t} error: {res}")
+                return
+            self._last_hash[t] = h
             try:
-                objs = await self.client.detect_objects(ev.frame)
-                objs_tuple = tuple(sorted(objs))
-                if objs_tuple and objs_tuple != self._last_objects:
-                    self._last_objects = objs_tuple
-                    self._update_time('_last_object')
-                    self.bus.emit(ObjectDetected(objects=list(objs_tuple)))
-                    logger.info(f"ObjectDetected emitted: {objs_tuple}")
+                self._emit(t, res)
             except Exception as e:
-                logger.warning(f"Object detection error: {e}")
+                logger.warning(f"{t} emit error: {e}")
 
-        # ── Caption path ────────────────────────────────────────
-        elif mtype == 'scene' and self._should_run(self._last_caption, self.caption_interval):
-            logger.debug("Triggering image caption on cloud")
-            try:
-                cap = await self.client.caption(ev.frame)
-                if cap and cap != self._last_caption_text:
-                    self._last_caption_text = cap
-                    self._update_time('_last_caption')
-                    self.bus.emit(ImageCaption(caption=cap))
-                    logger.info(f"ImageCaption emitted: {cap!r}")
-            except Exception as e:
-                logger.warning(f"Caption error: {e}")
+        logger.debug(f"Triggering cloud {', '.join(fresh)}")
+        try:
+            await self._call(self.client.analyze, ev.frame, fresh, on_result)
+        except Exception as e:
+            logger.warning(f"Cloud vision error ({', '.join(fresh)}): {e}")
 
-        else:
-            logger.debug(f"No cloud call for metadata type={mtype}")
+    def _due(self, task: str, now: float) -> bool:
+        last_attr, interval_attr = _TASK_TIMING[task]
+        return self._should_run(getattr(self, last_attr), getattr(self, interval_attr), now)
+
+    def _emit(self, task: str, res):
+        # ── OCR ──────────────────────────────────────────────────
+        if task == 'ocr':
+            if res and res != self._last_ocr_text:
+                self._last_ocr_text = res
+                self.bus.emit(OCRResult(text=res))
+                logger.info(f"OCRResult emitted: {res!r}")
+
+        # ── Object Detection ────────────────────────────────────
+        elif task == 'objects':
+            objs_tuple = tuple(sorted(res))
+            if objs_tuple and objs_tuple != self._last_objects:
+                self._last_objects = objs_tuple
+                self.bus.emit(ObjectDetected(objects=list(objs_tuple)))
+                logger.info(f"ObjectDetected emitted: {objs_tuple}")
+
+        # ── Caption ─────────────────────────────────────────────
+        elif task == 'caption':
+            if res and res != self._last_caption_text:
+                self._last_caption_text = res
+                self.bus.emit(ImageCaption(caption=res))
+                logger.info(f"ImageCaption emitted: {res!r}")
@@ -2,9 +2,12 @@ import threading
 import asyncio
 import time
 import logging
-from typing import Any, Optional
-import uuid
+from typing import Any, Optional, Tuple, Union
+import itertools
 import os
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
 
 import cv2
 import numpy as np
@@ -12,6 +15,8 @@ import httpx
 
 from vision.camera import Camera
 from core.event_bus import EventBus
+from core.http_client import RETRYABLE, backoff_schedule, json_loads, post_with_retries, warm_up
+from core.result_cache import ResultCache
 from events.events import InterestingFrame, ObstacleDetected
 from config import Config
 
@@ -20,17 +25,37 @@ logger.setLevel(logging.INFO)
 
 config = Config.get_config()
 
-def list_to_freq_dict(lst):
-    freq_dict = {}
-    for item in lst:
-        freq_dict[item] = freq_dict.get(item, 0) + 1
-    return freq_dict
+# saved frames go to tmpfs when there is one, so uploads read them from RAM
+FRAME_DIR = os.environ.get("LINA_TMP") or ("/dev/shm/lina" if os.path.isdir("/dev/shm") else "tmp")
+
+@lru_cache(maxsize=None)
+def _ensure_dir(path: str) -> str:
+    """makedirs once per directory instead of a stat per saved file."""
+    os.makedirs(path, exist_ok=True)
+    return path
+
+# per-process frame file names: pid + counter, no urandom read per frame
+_PID = os.getpid()
+_frame_ids = itertools.count()
+
+# an upload source: a path to an image file, or already-encoded image bytes
+Image = Union[str, bytes]
+
+async def _load_image(image: Image) -> Tuple[str, bytes]:
+    """(filename, bytes) for an upload; files are read off the event loop."""
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return "frame.jpg", bytes(image)
+    return os.path.basename(image), await asyncio.to_thread(Path(image).read_bytes)
+
+def _describe(image: Image) -> str:
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return f"<{len(image)} bytes>"
+    return image
 
 class VisionModule:
     def __init__(
         self,
         bus: EventBus,
-        max_queue: int = 10,
         scene_threshold: float = 0.7,
         http_timeout: float = 10.0,
         max_retries: int = 3,
@@ -39,7 +64,6 @@ class VisionModule:
     ):
         """
         :param bus:             shared EventBus
-        :param max_queue:       max asyncio queue size for frames
         :param scene_threshold: Bhattacharyya distance above which
                                  we consider the scene "changed"
         :param http_timeout:    seconds timeout for HTTP calls
@@ -47,20 +71,49 @@ class VisionModule:
         :param backoff_factor:  initial backoff delay in seconds
         """
         self.bus = bus
-        self._frame_queue = asyncio.Queue(maxsize=max_queue)
+        # single-slot hand-off: the capture thread overwrites _slot with the
+        # newest frame, so the processor never works through a stale backlog
+        self._slot = None
+        self._slot_lock = threading.Lock()
+        self._frame_ready = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
         self._running = False
         self._capture_thread: threading.Thread = None
+        self._camera: Optional[Camera] = None
         self.config = config
         self._latest_frame = None
 
+        # endpoint URLs are fixed for the module's lifetime
+        base = config["host"]["url"].rstrip("/")
+        self._ocr_url = base + config["ocr"]["endpoint"]
+        self._detect_url = base + config["detect"]["endpoint"]
+        self._caption_url = base + config["caption"]["endpoint"]
+        # optional fused endpoint: one upload answers caption, detections and text
+        analyze = config.get("analyze", {}).get("endpoint")
+        self._analyze_url = base + analyze if analyze else None
+        # None until the first analyze(); False once the server lacks it
+        self._has_analyze: Optional[bool] = None
+
         # Scene change detection
         self._prev_hist: Optional[np.ndarray] = None
+        # per-frame buffers, reused: _analyze handles one frame at a time.
+        # The two histograms ping-pong so _prev_hist is never overwritten.
+        self._small: Optional[np.ndarray] = None
+        # gray thumbnails alternate too, so the previous frame's stays readable
+        self._grays: list = [None, None]
+        self._gray_idx = 0
+        self._hists = (np.empty((64, 1), np.float32), np.empty((64, 1), np.float32))
         self.scene_threshold = scene_threshold
 
         # HTTP retry settings
         self.http_timeout = http_timeout
         self.max_retries = max_retries
         self.backoff_factor = backoff_factor
+        self._retry_delays = backoff_schedule(max_retries, backoff_factor)
+
+        # results for recently uploaded images, keyed (call, content digest):
+        # a frozen or repeated frame encodes to the same bytes
+        self._results = ResultCache(64)
 
     @property
     def latest_frame(self):
@@ -70,8 +123,10 @@ class VisionModule:
         if self._running:
             return
 
-        Camera().start()
+        self._camera = Camera()
+        self._camera.start()
         self._running = True
+        self._loop = asyncio.get_running_loop()
 
         # start capture in background thread
         self._capture_thread = threading.Thread(
@@ -89,35 +144,44 @@ class VisionModule:
         if not self._running:
             return
         self._running = False
-        Camera().stop()
+        self._camera.stop()
         logger.info("VisionModule stopped")
 
     def _capture_loop(self) -> None:
+        cam = self._camera
         while self._running:
             try:
-                frame = Camera().get_frame()
+                frame = cam.get_frame()
             except Exception as e:
                 logger.error("Camera read error: %s", e, exc_info=True)
                 break
 
-            if frame is not None:
-                self._latest_frame = frame
-                try:
-                    self._frame_queue.put_nowait(frame)
-                except asyncio.QueueFull:
-                    logger.debug("Frame queue full; dropping frame")
-
-            time.sleep(0.01)
+            if frame is None:
+                time.sleep(0.01)  # read() failed fast; don't spin on a dead stream
+                continue
+            self._latest_frame = frame
+            with self._slot_lock:
+                pending = self._slot is not None
+                self._slot = frame
+            if not pending:
+                self._loop.call_soon_threadsafe(self._frame_ready.set)
 
     async def _process_loop(self) -> None:
         while self._running:
             try:
-                frame = await asyncio.wait_for(self._frame_queue.get(), timeout=1.0)
+                await asyncio.wait_for(self._frame_ready.wait(), timeout=1.0)
             except asyncio.TimeoutError:
                 continue
+            self._frame_ready.clear()
+            with self._slot_lock:
+                frame, self._slot = self._slot, None
+            if frame is None:
+                continue
 
             try:
-                if self._detect_scene_change(frame):
+                # all per-frame OpenCV work runs in one worker hop, off the event loop
+                feats, changed = await asyncio.to_thread(self._analyze, frame)
+                if changed:
                     logger.info("Scene change detected -> emitting event")
                     self.bus.emit(InterestingFrame(frame=frame, metadata={"type": "scene"}))
 
@@ -125,20 +189,40 @@ class VisionModule:
                     logger.debug("Text detected -> emitting text event")
                     self.bus.emit(InterestingFrame(frame=frame, metadata={"type": "text"}))
                 else:
-                    dist = self._detect_obstacle(frame)
+                    dist = self._detect_obstacle(frame, feats)
                     if dist is not None:
                         logger.debug("Obstacle at %.2f m -> emitting obstacle event", dist)
                         self.bus.emit(ObstacleDetected(distance=dist))
 
             except Exception as e:
                 logger.error("Error in processing loop: %s", e, exc_info=True)
-            finally:
-                self._frame_queue.task_done()
 
-    def _detect_scene_change(self, frame: Any) -> bool:
+    def _analyze(self, frame: Any) -> Tuple[dict, bool]:
+        """Worker-thread half of _process_loop: features plus the scene verdict."""
+        feats = self._features(frame)
+        # a thumbnail identical to the previous frame's gives the same verdict,
+        # False, so static scenes and repeated frames skip the histogram
+        prev = self._grays[self._gray_idx ^ 1]
+        gray = feats["gray"]
+        if prev is not None and prev.shape == gray.shape and cv2.norm(prev, gray, cv2.NORM_INF) == 0:
+            return feats, False
+        return feats, self._detect_scene_change(feats)
+
+    def _features(self, frame: Any) -> dict:
+        """Downscaled arrays computed once per frame and shared by the detectors."""
+        # 128x128 nearest-neighbour subsample: the detectors only need a pixel
+        # sample, and unlike INTER_AREA it doesn't read the whole frame.
+        # OpenCV writes into the dst buffers, reallocating only on a shape change.
+        self._small = cv2.resize(frame, (128, 128), self._small, interpolation=cv2.INTER_NEAREST)
+        i = self._gray_idx = self._gray_idx ^ 1
+        self._grays[i] = cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, self._grays[i])
+        return {"small": self._small, "gray": self._grays[i]}
+
+    def _detect_scene_change(self, feats: dict) -> bool:
         try:
-            hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-            hist = cv2.calcHist([hsv], [0, 1], None, [50, 60], [0, 180, 0, 256])
+            a, b = self._hists
+            hist = b if self._prev_hist is a else a
+            cv2.calcHist([feats["gray"]], [0], None, [64], [0, 256], hist)
             cv2.normalize(hist, hist, alpha=0, beta=1, norm_type=cv2.NORM_MINMAX)
 
             if self._prev_hist is None:
@@ -155,85 +239,161 @@ class VisionModule:
             logger.error("Error in scene detection: %s", e, exc_info=True)
         return False
     
-    async def _detect_text(self, frame_path: str) -> str:
-        return await self.detect_text(frame_path)
+    async def _detect_text(self, image: Image) -> str:
+        return await self.detect_text(image)
 
-    async def detect_text(self, frame_path: str) -> str:
+    async def detect_text(self, image: Image) -> str:
         NO_TEXT_OR_FAILED = ""
+        if self.config.get("dev_offline", False):
+            return "debug text"
         # Placeholder: implement OCR-based detection
-        url = self.config["host"]["url"].rstrip("/") + self.config["ocr"]["endpoint"]
-        response = await ocr_image(frame_path, url)
+        filename, data = await _load_image(image)
+        key = ("ocr", ResultCache.digest(data))
+        text = self._results.get(key)
+        if text is not None:
+            return text
+        response = await ocr_image(data, self._ocr_url)
         
         text = response.get("text", NO_TEXT_OR_FAILED)
+        if response:  # {} means the request failed; don't remember that
+            self._results.put(key, text)
         return text
 
-    def _detect_obstacle(self, frame: Any) -> Optional[float]:
+    def _detect_obstacle(self, frame: Any, feats: dict) -> Optional[float]:
         # Placeholder: implement depth/distance measurement
         return None
 
+    async def warm_up(self):
+        """Pre-open pooled connections to the vision servers."""
+        if not self.config.get("dev_offline", False):
+            await warm_up((self._ocr_url, self._detect_url, self._caption_url, self._analyze_url))
+
     async def _post_with_retries(self, url: str, **kwargs) -> httpx.Response:
-        delay = self.backoff_factor
-        for attempt in range(1, self.max_retries + 1):
-            try:
-                async with httpx.AsyncClient(timeout=self.http_timeout) as client:
-                    resp = await client.post(url, **kwargs)
-                    resp.raise_for_status()
-                    return resp
-            except (httpx.ConnectError, httpx.ReadTimeout, httpx.RemoteProtocolError) as e:
-                logger.warning("HTTP request failed (attempt %d/%d) to %s: %s",
-                               attempt, self.max_retries, url, e)
-                if attempt == self.max_retries:
-                    logger.error("Max HTTP retries reached for %s", url)
-                    raise
-                await asyncio.sleep(delay)
-                delay *= 2
-            except httpx.HTTPStatusError as e:
-                logger.error("HTTP status error %d for %s: %s",
-                             e.response.status_code, url, e, exc_info=True)
-                raise
-
-    async def detect_objects(self, image_path: str) -> str:
-        logger.info("Detecting objects: %s", image_path)
-        filename = os.path.basename(image_path)
-        url = self.config["host"]["url"].rstrip("/") + self.config["detect"]["endpoint"]
+        return await post_with_retries(url, self._retry_delays,
+                                       timeout=self.http_timeout, **kwargs)
+
+    async def detect_objects(self, image: Image) -> str:
+        logger.info("Detecting objects: %s", _describe(image))
+        url = self._detect_url
         logger.debug("Detect URL: %s", url)
 
         if self.config.get("dev_offline", False):
             detections = [ {"class_name": "person"}, {"class_name": "car"} ]
         else:
             try:
-                with open(image_path, "rb") as f:
-                    files = {"file": (filename, f, "application/octet-stream")}
-                    resp = await self._post_with_retries(url, files=files)
-                detections = resp.json().get("detections", [])
+                filename, data = await _load_image(image)
+                key = ("detect", ResultCache.digest(data))
+                summary = self._results.get(key)
+                if summary is not None:
+                    return summary
+                files = {"file": (filename, data, "application/octet-stream")}
+                resp = await self._post_with_retries(url, files=files)
+                detections = json_loads(resp.content).get("detections", [])
             except Exception as e:
                 logger.error("Detection failed: %s", e, exc_info=True)
                 return "Detection error"
-        occurences = list_to_freq_dict([obj.get("class_name", "") for obj in detections])
+            summary = self._summarize_detections(detections)
+            self._results.put(key, summary)
+            return summary
+        return self._summarize_detections(detections)
+
+    @staticmethod
+    def _summarize_detections(detections: list) -> str:
+        occurences = Counter(obj.get("class_name", "") for obj in detections)
         return ", ".join(f"{v} {k}{'s' if v>1 else ''}" for k, v in occurences.items())
 
-    async def caption(self, image_path: str) -> str:
-        logger.info("Captioning: %s", image_path)
-        filename = os.path.basename(image_path)
-        url = self.config["host"]["url"].rstrip("/") + self.config["caption"]["endpoint"]
+    async def caption(self, image: Image) -> str:
+        logger.info("Captioning: %s", _describe(image))
+        url = self._caption_url
         logger.debug("Caption URL: %s", url)
 
+        if self.config.get("dev_offline", False):
+            return "debug caption"
+
         headers = {"Accept": "application/json"}
         try:
-            with open(image_path, "rb") as f:
-                files = {"file": (filename, f, "image/jpeg")}
-                resp = await self._post_with_retries(url, files=files, headers=headers)
-            return resp.json().get("caption", "")
+            filename, data = await _load_image(image)
+            key = ("caption", ResultCache.digest(data))
+            caption = self._results.get(key)
+            if caption is not None:
+                return caption
+            files = {"file": (filename, data, "image/jpeg")}
+            resp = await self._post_with_retries(url, files=files, headers=headers)
+            caption = json_loads(resp.content).get("caption", "")
+            self._results.put(key, caption)
+            return caption
         except Exception as e:
             logger.error("Caption failed: %s", e, exc_info=True)
             return ""
 
+    async def analyze(self, image: Image) -> Tuple[str, str, str]:
+        """
+        (caption, object summary, OCR text) for one image.
+
+        Uses the fused endpoint, one upload, when settings.json configures
+        analyze.endpoint and the server has it; otherwise the three
+        endpoints are called concurrently with the image read only once.
+        """
+        logger.info("Analyzing: %s", _describe(image))
+        filename, data = await _load_image(image)
+        if not data:
+            return "", "", ""  # nothing to upload: no frame was captured
+        key = ("analyze", ResultCache.digest(data))
+        cached = self._results.get(key)
+        if cached is not None:
+            logger.debug("Analyze cache hit")
+            return cached
+
+        if (self._analyze_url and self._has_analyze is not False
+                and not self.config.get("dev_offline", False)):
+            try:
+                files = {"file": (filename, data, "image/jpeg")}
+                resp = await self._post_with_retries(self._analyze_url, files=files)
+                self._has_analyze = True
+                out = json_loads(resp.content)
+                result = (out.get("caption", ""),
+                          self._summarize_detections(out.get("detections", [])),
+                          out.get("text", ""))
+                self._results.put(key, result)
+                return result
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code in (404, 405) and not self._has_analyze:
+                    logger.info("No fused analyze endpoint; using separate endpoints")
+                    self._has_analyze = False
+                else:
+                    logger.warning("Analyze failed, using separate endpoints: %s", e)
+            except Exception as e:
+                logger.warning("Analyze failed, using separate endpoints: %s", e)
+
+        results = await asyncio.gather(
+            self.caption(data), self.detect_objects(data), self.detect_text(data),
+            return_exceptions=True,
+        )
+        for name, res in zip(("Caption", "Detection", "OCR"), results):
+            if isinstance(res, Exception):
+                logger.warning("%s failed: %s", name, res)
+        return tuple("" if isinstance(res, Exception) else res for res in results)
+
+    @staticmethod
+    def encode_frame(frame: Any, quality: int = 80) -> bytes:
+        """JPEG-encode a frame in memory; b"" if encoding fails."""
+        # no Huffman optimization pass: it doubles encode time for ~5% smaller files
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality,
+                                               cv2.IMWRITE_JPEG_OPTIMIZE, 0])
+        return buf.tobytes() if ok else b""
+
     def save_frame(self, frame: Any) -> str:
+        """Write a frame to FRAME_DIR as JPEG, for debugging; uploads use encode_frame."""
         try:
-            frame_dir = "tmp"
-            os.makedirs(frame_dir, exist_ok=True)
-            frame_path = os.path.join(frame_dir, f"{uuid.uuid4().hex}.jpg")
-            cv2.imwrite(frame_path, frame)
+            frame_path = os.path.join(_ensure_dir(FRAME_DIR), f"{_PID}_{next(_frame_ids)}.jpg")
+            buf = self.encode_frame(frame)
+            if not buf:
+                raise ValueError("JPEG encoding failed")
+            fd = os.open(frame_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                os.write(fd, buf)
+            finally:
+                os.close(fd)
             logger.info("Frame saved to: %s", frame_path)
             return frame_path
         except Exception as e:
@@ -242,7 +402,7 @@ class VisionModule:
 
 # OCR helper function
 async def ocr_image(
-    image_path: str,
+    image: Image,
     url: str = "http://127.0.0.1:8866/ocr/",
     timeout: float = 10.0,
     max_retries: int = 3,
@@ -251,35 +411,20 @@ async def ocr_image(
     """
     Send an image to the OCR service and return the JSON response.
     Implements manual retry/back-off on network errors.
+    `image` is a file path or already-encoded image bytes.
     """
-    filename = os.path.basename(image_path)
     headers = {"accept": "application/json"}
-    delay = backoff_factor
+    # read once, off the event loop; the bytes are reused by every retry
+    filename, data = await _load_image(image)
+    files = {"image": (filename, data, "image/png")}
 
-    for attempt in range(1, max_retries + 1):
-        try:
-            with open(image_path, "rb") as f:
-                files = {"image": (filename, f, "image/png")}
-                async with httpx.AsyncClient(timeout=timeout) as client:
-                    resp = await client.post(url, headers=headers, files=files)
-                    resp.raise_for_status()
-                    return resp.json()
-        except (httpx.ConnectError, httpx.ReadTimeout, httpx.RemoteProtocolError) as e:
-            logger.warning(
-                "OCR request failed (attempt %d/%d) to %s: %s",
-                attempt, max_retries, url, e
-            )
-            if attempt == max_retries:
-                logger.error("Max OCR retries reached for %s", url)
-                return {}
-            await asyncio.sleep(delay)
-            delay *= 2
-        except httpx.HTTPStatusError as e:
-            logger.error(
-                "OCR service returned HTTP %d: %s",
-                e.response.status_code, e
-            )
-            return {}
+    try:
+        resp = await post_with_retries(url, backoff_schedule(max_retries, backoff_factor),
+                                       headers=headers, files=files, timeout=timeout)
+        return json_loads(resp.content)
+    except (httpx.HTTPStatusError, *RETRYABLE) as e:
+        logger.error("OCR request to %s failed: %s", url, e)
+        return {}
 
 if __name__ == "__main__":
     # Example usage
@@ -5,13 +5,28 @@ import logging
 import asyncio
 import time
 import httpx
-import uuid
+import itertools
+from functools import lru_cache
 from pathlib import Path
+from typing import Union
 from config import Config
+from core import http_client
+from core.result_cache import ResultCache
 
 config = Config.get_config()
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=None)
+def _ensure_dir(path: str) -> Path:
+    """mkdir once per output directory instead of on every reply."""
+    p = Path(path)
+    p.mkdir(parents=True, exist_ok=True)
+    return p
+
+# per-process TTS file names: pid + counter, no urandom read per reply
+_PID = os.getpid()
+_tts_ids = itertools.count()
+
 class STTModule:
     """
     Resilient Speech-to-text / Chat / TTS client,
@@ -25,46 +40,62 @@ class STTModule:
         self.timeout = timeout
         self.max_retries = max_retries
         self.backoff_factor = backoff_factor
+        self._retry_delays = http_client.backoff_schedule(max_retries, backoff_factor)
+        self.config = config
+
+        # endpoint URLs are fixed for the module's lifetime
+        base = config["host"]["url"].rstrip("/")
+        self._asr_url = base + config["asr"]["endpoint"]
+        self._chat_url = base + config["chat"]["endpoint"]
+        self._tts_url = base + config["tts"]["endpoint"]
+
+        # transcripts of recently sent audio, by content
+        self._transcripts = ResultCache(32)
+
+    async def warm_up(self):
+        """Pre-open pooled connections to the ASR, chat and TTS servers."""
+        if self.config.get("dev_offline", False):
+            return
+        await http_client.warm_up((self._asr_url, self._chat_url, self._tts_url))
 
     async def _post(self, url: str, **kwargs) -> httpx.Response:
         """
         POST with retries on network errors/timeouts.
         """
-        delay = self.backoff_factor
-        for attempt in range(1, self.max_retries + 1):
-            try:
-                async with httpx.AsyncClient(timeout=self.timeout) as client:
-                    resp = await client.post(url, **kwargs)
-                    resp.raise_for_status()
-                    return resp
-            except (httpx.ConnectError, httpx.ReadTimeout, httpx.RemoteProtocolError) as e:
-                logger.warning("Request to %s failed (attempt %d/%d): %s",
-                               url, attempt, self.max_retries, e)
-                if attempt == self.max_retries:
-                    logger.error("Max retries reached for %s", url)
-                    raise
-                await asyncio.sleep(delay)
-                delay *= 2
-            except httpx.HTTPStatusError as e:
-                # 4xx or 5xx: no point retrying
-                logger.error("Server returned error for %s: %s", url, e)
-                raise
-
-    async def transcribe(self, audio_path: str) -> str:
-        if not os.path.isfile(audio_path):
-            logger.warning("transcribe: file not found %s", audio_path)
+        return await http_client.post_with_retries(
+            url, self._retry_delays, timeout=self.timeout, **kwargs)
+
+    async def transcribe(self, audio: Union[str, bytes]) -> str:
+        """Transcribe a WAV file, given as a path or as the file's bytes."""
+        in_memory = isinstance(audio, (bytes, bytearray, memoryview))
+        if not in_memory and not os.path.isfile(audio):
+            logger.warning("transcribe: file not found %s", audio)
             return ""
+        if self.config.get("dev_offline", False):
+            return "Text DEBUG"
 
-        url = config["host"]["url"].rstrip("/") + config["asr"]["endpoint"]
-        logger.debug("Transcribing %s → %s", audio_path, url)
+        url = self._asr_url
+        logger.debug("Transcribing %s → %s",
+                     f"<{len(audio)} bytes>" if in_memory else audio, url)
 
         try:
-            filename = Path(audio_path).name
             headers = {"Accept": "application/json"}
-            with open(audio_path, "rb") as f:
-                files = {"audio_file": (filename, f, "audio/wav")}
-                resp = await self._post(url, files=files, headers=headers)
-            return resp.json().get("transcript", "")
+            if in_memory:
+                filename, data = "utterance.wav", bytes(audio)
+            else:
+                filename = Path(audio).name
+                # read once, off the event loop; the bytes are reused by every retry
+                data = await asyncio.to_thread(Path(audio).read_bytes)
+            key = ResultCache.digest(data)
+            transcript = self._transcripts.get(key)
+            if transcript is not None:
+                logger.debug("Transcript cache hit")
+                return transcript
+            files = {"audio_file": (filename, data, "audio/wav")}
+            resp = await self._post(url, files=files, headers=headers)
+            transcript = http_client.json_loads(resp.content).get("transcript", "")
+            self._transcripts.put(key, transcript)
+            return transcript
         except Exception as e:
             logger.error("transcribe failed: %s", e, exc_info=True)
             return ""
@@ -74,7 +105,9 @@ class STTModule:
                    user_id: str,
                    temperature: float = 0.7,
                    max_tokens: int = 100) -> str:
-        url = config["host"]["url"].rstrip("/") + config["chat"]["endpoint"]
+        if self.config.get("dev_offline", False):
+            return "debug reply"
+        url = self._chat_url
         payload = {
             "prompt": prompt,
             "user_id": user_id,
@@ -85,8 +118,8 @@ class STTModule:
         logger.debug("Chat request → %s %r", url, payload)
 
         try:
-            resp = await self._post(url, json=payload, headers=headers)
-            return resp.json().get("response", "")
+            resp = await self._post(url, content=http_client.json_dumps(payload), headers=headers)
+            return http_client.json_loads(resp.content).get("response", "")
         except Exception as e:
             logger.error("chat failed: %s", e, exc_info=True)
             return "Sorry, something went wrong."
@@ -95,18 +128,20 @@ class STTModule:
                                 text: str,
                                 *,
                                 output_dir: str = "tmp") -> Path:
-        url = config["host"]["url"].rstrip("/") + config["tts"]["endpoint"]
+        if self.config.get("dev_offline", False):
+            return Path("sounds") / "response.wav"
+        url = self._tts_url
         payload = {"text": text}
-        headers = {"Accept": "application/json"}
+        headers = {"Accept": "application/json", "Content-Type": "application/json"}
 
-        Path(output_dir).mkdir(parents=True, exist_ok=True)
-        filename = f"tts_{uuid.uuid4().hex}.mp3"
-        out_path = Path(output_dir) / filename
+        filename = f"tts_{_PID}_{next(_tts_ids)}.mp3"
+        out_path = _ensure_dir(output_dir) / filename
 
         logger.debug("TTS request → %s %r", url, payload)
         try:
-            resp = await self._post(url, json=payload, headers=headers)
-            out_path.write_bytes(resp.content)
+            resp = await self._post(url, content=http_client.json_dumps(payload), headers=headers)
+            # the write can stall on the SD card; keep it off the event loop
+            await asyncio.to_thread(out_path.write_bytes, resp.content)
             logger.info("TTS audio saved to %s", out_path)
         except Exception as e:
             logger.error("synthesize_speech failed: %s", e, exc_info=True)
@@ -123,6 +158,7 @@ if __name__ == "__main__":
         print("Chat reply:", await stt.chat("Hello!", "user123"))
         tts_path = await stt.synthesize_speech("Test speech output")
         print("TTS saved to:", tts_path)
+        await http_client.aclose()
 
     # ensure logging shows up on console
     logging.basicConfig(level=logging.DEBUG)
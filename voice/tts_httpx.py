@@ -1,10 +1,11 @@
 # app/tts/tts_client.py
 
-import uuid
+import itertools
 import os
 import logging
 import asyncio
 import httpx
+from functools import lru_cache
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
@@ -15,14 +16,36 @@ TIMEOUT = 10.0         # seconds per request
 MAX_RETRIES = 3
 BACKOFF_FACTOR = 1.0    # initial backoff in seconds
 
+@lru_cache(maxsize=None)
+def _ensure_dir(path: str) -> Path:
+    """mkdir once per output directory instead of on every call."""
+    p = Path(path)
+    p.mkdir(parents=True, exist_ok=True)
+    return p
+
+# per-process output names: pid + counter, no urandom read per file
+_PID = os.getpid()
+_file_ids = itertools.count()
+
+# Pooled client, created on first use; every request and retry reuses its connections
+_CLIENT = None
+
+def _get_client() -> httpx.AsyncClient:
+    global _CLIENT
+    if _CLIENT is None or _CLIENT.is_closed:
+        _CLIENT = httpx.AsyncClient(
+            timeout=TIMEOUT,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        )
+    return _CLIENT
+
 async def _post_with_retries(url: str, **kwargs) -> httpx.Response:
     delay = BACKOFF_FACTOR
     for attempt in range(1, MAX_RETRIES + 1):
         try:
-            async with httpx.AsyncClient(timeout=TIMEOUT) as client:
-                resp = await client.post(url, **kwargs)
-                resp.raise_for_status()
-                return resp
+            resp = await _get_client().post(url, **kwargs)
+            resp.raise_for_status()
+            return resp
         except (httpx.ConnectError, httpx.ReadTimeout, httpx.RemoteProtocolError) as e:
             logger.warning(
                 "TTS request failed (attempt %d/%d) to %s: %s",
@@ -46,18 +69,15 @@ async def synthesize_speech(text: str, *, output_dir: str = "tmp") -> Path:
     payload = {"text": text}
     headers = {"Accept": "application/json"}
 
-    # Ensure output directory exists
-    Path(output_dir).mkdir(parents=True, exist_ok=True)
-
     try:
         logger.debug("Sending TTS payload to %s: %r", TTS_URL, payload)
         resp = await _post_with_retries(TTS_URL, json=payload, headers=headers)
         audio_bytes = resp.content
 
         # Write to a uniquely-named file
-        filename = f"tts_{uuid.uuid4().hex}.mp3"
-        output_path = Path(output_dir) / filename
-        output_path.write_bytes(audio_bytes)
+        filename = f"tts_{_PID}_{next(_file_ids)}.mp3"
+        output_path = _ensure_dir(output_dir) / filename
+        await asyncio.to_thread(output_path.write_bytes, audio_bytes)
         logger.info("TTS audio saved to %s", output_path)
         return output_path
 
@@ -69,8 +89,12 @@ async def synthesize_speech(text: str, *, output_dir: str = "tmp") -> Path:
 async def main():
     # configure logging to console for testing
     logging.basicConfig(level=logging.DEBUG)
-    path = await synthesize_speech("I encountered some issues. Can you try again please ?")
-    print(f"Audio saved to {path}")
+    try:
+        path = await synthesize_speech("I encountered some issues. Can you try again please ?")
+        print(f"Audio saved to {path}")
+    finally:
+        if _CLIENT is not None:
+            await _CLIENT.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,5 +1,6 @@
 import asyncio
 import logging
+import re
 import time
 from uuid import uuid4
 from typing import Any, List
@@ -15,6 +16,30 @@ from voice.command_parser import CommandParser
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# split replies after sentence-ending punctuation, keeping it with its sentence
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+# the LLM turn prompt; filled by prepare_prompt
+_PROMPT_TEMPLATE = (
+    "{userinput}\n\n"
+    "Caption: \"{caption}\"\n"
+    "Detected objects: {objects}\n"
+    "Detected text: {text}\n"
+    "Using this context, respond clearly and concisely."
+)
+
+# looped while waiting for speech, once per turn
+_PROMPT_SOUND = "sounds/waterdropletechoed.wav"
+
+class _Turn:
+    """State of one listening turn, shared with that turn's record() callbacks."""
+    __slots__ = ("pid", "heard", "vision_task")
+
+    def __init__(self):
+        self.pid = None      # looping prompt sound, once started
+        self.heard = False   # speech began (or the turn ended): no prompt from now on
+        self.vision_task = None
+
 class VoiceModule:
     """
     Listens for speech (via VAD), transcribes it, grabs the current frame,
@@ -28,100 +53,135 @@ class VoiceModule:
         stt: STTModule,
         parser: CommandParser,
         silence_duration: float = 2.0,
+        barge_in: bool = False,
     ):
+        """
+        :param barge_in: let speech interrupt a reply that is already playing.
+                         Only enable it when the mic is echo-cancelled (e.g.
+                         PulseAudio module-echo-cancel as the capture source);
+                         otherwise the reply heard through the speaker would
+                         cut itself off. A reply that is not playing yet can
+                         always be interrupted.
+        """
         self.bus = bus
         self.audio = audio
         self.vision = vision
         self.stt = stt
         self.parser = parser
         self.silence_duration = silence_duration
+        self.barge_in = barge_in
         self._task: asyncio.Task = None
+        self._warm_task: asyncio.Task = None
+        # chat, speech and playback of the last reply; cancelled on barge-in
+        self._reply_task: asyncio.Task = None
+        # decoded once here; every turn's prompt then plays from memory
+        if not self.audio.preload(_PROMPT_SOUND):
+            logger.warning("Prompt sound %s not cached; it will stream from disk", _PROMPT_SOUND)
 
     def start(self):
         if self._task is None:
             try:
                 # preload some sounds if needed
-                self.audio.add_audio_to_queue("sounds/waterdropletechoed.wav")
+                self.audio.add_audio_to_queue(_PROMPT_SOUND)
             except Exception as e:
                 logger.error("Failed to preload audio: %s", e, exc_info=True)
 
             self._task = asyncio.create_task(self._run())
+            # connect to the servers while the user is still speaking, so the
+            # first turn's requests reuse pooled connections
+            self._warm_task = asyncio.create_task(self._warm_up())
             logger.info("VoiceModule started")
 
     def stop(self):
         if self._task:
             self._task.cancel()
             self._task = None
+            if self._reply_task:
+                self._reply_task.cancel()
             logger.info("VoiceModule stopped")
 
     async def _run(self):
         while True:
             try:
                 logger.info("Waiting for user speech...")
-                # record audio
-                try:
-                    pid = self.audio.schedule("sounds/waterdropletechoed.wav", priority=0, loop=True)
-                except Exception as e:
-                    logger.warning("Failed to play prompt sound: %s", e, exc_info=True)
-                    pid = None
+                # the previous reply may still be in progress: the user can talk
+                # over it, and the prompt sound waits until it has finished.
+                # Callbacks bind this turn's state, never a later iteration's.
+                turn = _Turn()
+
+                def play_prompt(_=None, turn=turn):
+                    if turn.heard:
+                        return
+                    try:
+                        turn.pid = self.audio.schedule(_PROMPT_SOUND, priority=0, loop=True)
+                    except Exception as e:
+                        logger.warning("Failed to play prompt sound: %s", e, exc_info=True)
+
+                def on_speech(turn=turn):
+                    turn.heard = True
+                    if self._may_interrupt():
+                        self._barge_in()
+
+                reply_task = self._reply_task if self._replying() else None
+                if reply_task is not None:
+                    reply_task.add_done_callback(play_prompt)
+                else:
+                    play_prompt()
+
+                # vision starts at the first pause in speech, so it usually runs
+                # during the silence that ends the utterance rather than after
+                # it. Once per utterance: cancelling an upload at every phrase
+                # break would also throw away its pooled connection.
+                def on_pause(turn=turn):
+                    if turn.vision_task is None:
+                        turn.vision_task = asyncio.create_task(self._look())
 
                 try:
-                    audio_path = await asyncio.wait_for(
-                        self.audio.record(silence_duration=self.silence_duration),
+                    # the utterance stays in memory: no WAV written just to be re-read
+                    audio_wav = await asyncio.wait_for(
+                        self.audio.record(silence_duration=self.silence_duration, in_memory=True,
+                                          on_speech=on_speech, on_pause=on_pause),
                         timeout=self.silence_duration + 5
                     )
-                    logger.info("Recorded audio: %s", audio_path)
+                    logger.info("Recorded audio: %d bytes", len(audio_wav))
                 except Exception as e:
                     logger.error("Audio recording failed: %s", e, exc_info=True)
-                    audio_path = None
+                    audio_wav = None
 
-                # stop prompt sound
-                if pid is not None:
+                # stop prompt sound; a reply outliving this turn must not start it
+                turn.heard = True
+                if reply_task is not None:
+                    reply_task.remove_done_callback(play_prompt)
+                if turn.pid is not None:
                     try:
-                        self.audio.stop_sound(pid)
+                        self.audio.stop_sound(turn.pid)
                     except Exception:
                         pass
 
-                # capture frame
-                frame_path = None
-                try:
-                    frame = self.vision.latest_frame
-                    frame_path = self.vision.save_frame(frame)
-                    logger.info("Saved frame: %s", frame_path)
-                except Exception as e:
-                    logger.error("Frame capture failed: %s", e, exc_info=True)
+                # no pause seen (utterance cut at its length cap): vision
+                # still runs alongside transcription
+                vision_task = turn.vision_task
+                if audio_wav and vision_task is None:
+                    vision_task = asyncio.create_task(self._look())
 
                 # transcription
                 userinput = ""
-                if audio_path:
+                if audio_wav:
                     try:
                         if self.stt:
-                            userinput = await self.stt.transcribe(audio_path)
+                            userinput = await self.stt.transcribe(audio_wav)
                     except Exception as e:
                         logger.error("Transcription failed: %s", e, exc_info=True)
                 logger.info("Transcribed text: %r", userinput)
 
                 if not userinput:
+                    if vision_task is not None:
+                        vision_task.cancel()
                     logger.info("No user input; skipping processing")
                     await asyncio.sleep(0.5)
                     continue
 
-                # vision processing
-                caption = ""
-                detection = ""
-                ocr_text = ""
-                try:
-                    caption = await self.vision.caption(frame_path)
-                except Exception as e:
-                    logger.warning("Captioning failed: %s", e, exc_info=True)
-                try:
-                    detection = await self.vision.detect_objects(frame_path)
-                except Exception as e:
-                    logger.warning("Object detection failed: %s", e, exc_info=True)
-                try:
-                    ocr_text = await self.vision.detect_text(frame_path)
-                except Exception as e:
-                    logger.warning("OCR failed: %s", e, exc_info=True)
+                caption, detection, ocr_text = await vision_task
 
                 # prepare prompt
                 prompt = self.prepare_prompt(
@@ -129,27 +189,16 @@ class VoiceModule:
                 )
                 logger.info("Generated prompt for LLM: %s", prompt)
 
-                # chat response
-                reply = ""
-                try:
-                    reply = await self.stt.chat(prompt, user_id=self.stt.config.get("user_id", ""))
-                except Exception as e:
-                    logger.error("Chat request failed: %s", e, exc_info=True)
-
-                # speak reply
-                try:
-                    reply_audio = await self.stt.synthesize_speech(reply)
-                    self.audio.add_audio_to_queue(str(reply_audio))
-                except Exception as e:
-                    logger.error("Speech synthesis failed: %s", e, exc_info=True)
-
-                # emit event
-                try:
-                    cmd, params = await self.parser.parse(reply)
-                    evt = UserCommand(text=reply, command=cmd, params=params)
-                    self.bus.emit(evt)
-                except Exception as e:
-                    logger.warning("Command parsing or emit failed: %s", e, exc_info=True)
+                # reply in the background and go straight back to listening,
+                # so speech during the reply can interrupt it. At most one
+                # reply exists: a turn still replying here (no speech onset
+                # was reported) is dropped in favour of the newer one, unless
+                # it is playing and barge-in is off, when the new one waits.
+                if self._may_interrupt():
+                    self._barge_in()
+                elif self._replying():
+                    await asyncio.wait({self._reply_task})
+                self._reply_task = asyncio.create_task(self._reply(prompt))
 
                 await asyncio.sleep(0.1)
 
@@ -160,6 +209,90 @@ class VoiceModule:
                 logger.error("Unexpected error in VoiceModule loop: %s", e, exc_info=True)
                 await asyncio.sleep(1)
 
+    async def _reply(self, prompt: str):
+        """Chat, speak the reply, emit its command and wait for playback to end."""
+        # chat response
+        reply = ""
+        try:
+            reply = await self.stt.chat(prompt, user_id=self.stt.config.get("user_id", ""))
+        except Exception as e:
+            logger.error("Chat request failed: %s", e, exc_info=True)
+
+        # speak reply
+        await self._speak(reply)
+
+        # emit event
+        try:
+            cmd, params = await self.parser.parse(reply)
+            evt = UserCommand(text=reply, command=cmd, params=params)
+            self.bus.emit(evt)
+        except Exception as e:
+            logger.warning("Command parsing or emit failed: %s", e, exc_info=True)
+
+        await self.audio.wait_queue()
+
+    def _replying(self) -> bool:
+        return self._reply_task is not None and not self._reply_task.done()
+
+    def _may_interrupt(self) -> bool:
+        # without echo cancellation, onset during playback is likely our own voice
+        return self.barge_in or not self.audio.list_queue_playing()
+
+    def _barge_in(self):
+        """Drop the reply in progress: pending requests and queued or playing audio."""
+        if self._replying():
+            logger.info("Barge-in: cancelling the current reply")
+            # cancelling aborts the in-flight chat/TTS requests with it
+            self._reply_task.cancel()
+            self.audio.flush_queue()
+
+    async def _warm_up(self):
+        try:
+            await asyncio.gather(self.stt.warm_up(), self.vision.warm_up())
+        except Exception as e:
+            logger.debug("Connection warm-up failed: %s", e)
+
+    async def _look(self) -> tuple:
+        """(caption, detection, ocr_text) for the current camera frame."""
+        # capture frame, JPEG-encoded in memory for the vision uploads
+        frame_jpg = b""
+        try:
+            frame = self.vision.latest_frame
+            if frame is not None:
+                frame_jpg = await asyncio.to_thread(self.vision.encode_frame, frame)
+                logger.info("Encoded frame: %d bytes", len(frame_jpg))
+        except Exception as e:
+            logger.error("Frame capture failed: %s", e, exc_info=True)
+        if not frame_jpg:
+            logger.info("No camera frame; skipping vision")
+            return "", "", ""
+
+        # vision processing: one fused request, or the three in parallel
+        try:
+            return await self.vision.analyze(frame_jpg)
+        except Exception as e:
+            logger.warning("Vision analysis failed: %s", e, exc_info=True)
+            return "", "", ""
+
+    async def _speak(self, reply: str):
+        """
+        Synthesize the reply sentence by sentence and queue each clip as soon
+        as it and the ones before it are ready, so playback starts after the
+        first sentence's TTS round trip rather than the whole reply's.
+        """
+        sentences = [s for s in _SENTENCE_END.split(reply.strip()) if s] or [reply]
+        tasks = [asyncio.create_task(self.stt.synthesize_speech(s)) for s in sentences]
+        try:
+            for task in tasks:
+                try:
+                    self.audio.add_audio_to_queue(str(await task))
+                except Exception as e:
+                    logger.error("Speech synthesis failed: %s", e, exc_info=True)
+        finally:
+            # on barge-in, the later sentences' requests go too
+            for task in tasks:
+                task.cancel()
+
     def prepare_prompt(
         self,
         userinput: str,
@@ -170,17 +303,10 @@ class VoiceModule:
         """
         Builds a user-role message combining speech and vision context.
         """
-        try:
-            return (
-                f"{userinput}\n\n"
-                f"Caption: \"{caption}\"\n"
-                f"Detected objects: {objects}\n"
-                f"Detected text: {text or 'none'}\n"
-                "Using this context, respond clearly and concisely."
-            )
-        except Exception as e:
-            logger.error("prepare_prompt failed: %s", e, exc_info=True)
-            return userinput
+        if isinstance(objects, (list, tuple)):
+            objects = ", ".join(map(str, objects))  # a readable list, not its repr
+        return _PROMPT_TEMPLATE.format(
+            userinput=userinput, caption=caption, objects=objects, text=text or "none")
 
     def prompt_llm(self, prompt: str):
         # placeholder for synchronous LLM calls
@@ -188,15 +314,27 @@ class VoiceModule:
 
 if __name__ == "__main__":
     # minimal demo
+    try:
+        import uvloop  # faster socket I/O for the cloud calls, when installed
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
+    async def main():
+        bus = EventBus()
+        audio = AudioModule()
+        vision = VisionModule(bus)
+        stt = STTModule()
+        parser = CommandParser()
+        vm = VoiceModule(bus, audio, vision, stt, parser)
+        vm.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            vm.stop()
+
     logging.basicConfig(level=logging.INFO)
-    bus = EventBus()
-    audio = AudioModule()
-    vision = VisionModule(bus)
-    stt = STTModule()
-    parser = CommandParser()
-    vm = VoiceModule(bus, audio, vision, stt, parser)
-    vm.start()
     try:
-        asyncio.get_event_loop().run_forever()
+        asyncio.run(main())
     except KeyboardInterrupt:
-        vm.stop()
+        pass